@@ -1,1498 +1,650 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify
+import click
 import os
-from datetime import datetime
-
-app = Flask(name)
-
-File to store todos (acts as our "database")
+import signal
+import sys
+import threading
+
+import codec
+from assets import AssetBundle
+from models import parse_timestamp
+from compression import ResponseCompressor
+from search import QueryTooBroad
+from storage import (BatchError, JSONFileBackend, PreconditionFailed, SQLiteBackend, TodoStore,
+                     WriteAheadLogBackend, load_todos, save_todos, todo_etag)
+
+# Static files go through AssetBundle rather than Flask's static route
+app = Flask(__name__, static_folder=None)
+app.json = codec.JSONProvider(app)
+
+# File to store todos (acts as our "database")
 TODOS_FILE = 'todos.json'
 
-def load_todos():
-"""Load todos from JSON file"""
-if os.path.exists(TODOS_FILE):
-try:
-with open(TODOS_FILE, 'r') as f:
-return json.load(f)
-except (json.JSONDecodeError, FileNotFoundError):
-return []
-return []
-
-def save_todos(todos):
-"""Save todos to JSON file"""
-with open(TODOS_FILE, 'w') as f:
-json.dump(todos, f, indent=2)
+# Write-behind settings: pending changes are flushed to TODOS_FILE every
+# FLUSH_INTERVAL seconds, or as soon as FLUSH_THRESHOLD of them pile up
+FLUSH_INTERVAL = float(os.environ.get('TODOS_FLUSH_INTERVAL', '1.0'))
+FLUSH_THRESHOLD = int(os.environ.get('TODOS_FLUSH_THRESHOLD', '100'))
+
+# How changes reach TODOS_FILE: 'json' rewrites the whole file on each
+# flush, 'wal' appends one record per change to TODOS_FILE + '.log' and
+# compacts the log into TODOS_FILE once it passes COMPACT_BYTES, 'sqlite'
+# keeps one row per todo in TODOS_DB
+STORAGE = os.environ.get('TODOS_STORAGE', 'json')
+COMPACT_BYTES = int(os.environ.get('TODOS_COMPACT_BYTES', str(4 * 1024 * 1024)))
+TODOS_DB = os.environ.get('TODOS_DB', 'todos.db')
+
+# Indent TODOS_FILE for people reading it; compact files are smaller and
+# quicker to write
+JSON_PRETTY = os.environ.get('TODOS_JSON_PRETTY', '') not in ('', '0')
+
+# Format TODOS_FILE is written in: 'json', or 'binary' for the columnar
+# snapshot in snapshot.py, which is smaller and faster to load. Either
+# format is read back regardless, so switching converts on the next write
+SNAPSHOT_FORMAT = os.environ.get('TODOS_SNAPSHOT_FORMAT', 'json')
+
+# Memory-map a binary TODOS_FILE instead of reading it into dicts; todos are
+# then decoded only when a request touches them. Pairs best with 'wal'
+# storage, which rewrites the snapshot only on compaction
+MMAP_SNAPSHOT = os.environ.get('TODOS_MMAP', '') not in ('', '0')
+
+# Set when several processes serve the same TODOS_FILE/TODOS_DB (e.g. gunicorn
+# workers): every change is then written through under a file lock, and each
+# process reloads when it sees another one's write
+SHARED = os.environ.get('TODOS_SHARED', '') not in ('', '0')
+
+def make_backend():
+    """Build the persistence backend selected by STORAGE"""
+    if SNAPSHOT_FORMAT not in ('json', 'binary'):
+        raise ValueError('Unknown TODOS_SNAPSHOT_FORMAT: %r' % (SNAPSHOT_FORMAT,))
+    binary = SNAPSHOT_FORMAT == 'binary'
+    if STORAGE == 'wal':
+        return WriteAheadLogBackend(TODOS_FILE, compact_bytes=COMPACT_BYTES, shared=SHARED,
+                                    pretty=JSON_PRETTY, binary=binary, lazy=MMAP_SNAPSHOT)
+    if STORAGE == 'sqlite':
+        return SQLiteBackend(TODOS_DB)
+    if STORAGE == 'json':
+        return JSONFileBackend(TODOS_FILE, pretty=JSON_PRETTY, binary=binary, lazy=MMAP_SNAPSHOT)
+    raise ValueError('Unknown TODOS_STORAGE: %r' % (STORAGE,))
+
+# Largest page GET /api/todos will return, and the fields it can project
+MAX_PAGE_SIZE = 1000
+TODO_FIELDS = ('id', 'text', 'completed', 'created_at')
+
+# Todos encoded per chunk when GET /api/todos streams the whole list
+STREAM_CHUNK = 500
+
+# Results GET /api/todos/search returns unless ``limit`` asks otherwise
+SEARCH_LIMIT = 20
+
+# Most operations one POST /api/todos/batch may carry
+MAX_BATCH_SIZE = 10000
+
+# Changes remembered for GET /api/todos/changes; clients further behind
+# than this get a full snapshot instead
+JOURNAL_SIZE = int(os.environ.get('TODOS_JOURNAL_SIZE', '10000'))
+
+# Seconds between keep-alive comments on an idle /api/todos/stream
+STREAM_KEEPALIVE = 15
+
+# Open /api/todos/stream responses allowed at once (unset: no limit). Under
+# a threaded server each one holds a request thread, so `serve` defaults
+# this to half its threads; past it streams get a 503 and the page polls
+MAX_STREAMS = int(os.environ['TODOS_MAX_STREAMS']) if os.environ.get('TODOS_MAX_STREAMS') else None
+
+# Values of the ``status`` filter, mapped to the store's completed flag
+STATUSES = {'all': None, 'active': False, 'completed': True}
+
+# Values of ``order``, for listing todos by creation time
+ORDERS = ('oldest', 'newest')
+
+# API responses of at least COMPRESS_MIN_SIZE bytes (and all streamed ones)
+# are compressed with the best of zstd/br/gzip the client accepts, at these
+# levels; lower levels trade ratio for CPU per request
+COMPRESS_MIN_SIZE = int(os.environ.get('TODOS_COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('TODOS_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('TODOS_BROTLI_QUALITY', '4'))
+ZSTD_LEVEL = int(os.environ.get('TODOS_ZSTD_LEVEL', '3'))
+
+# Loaded once at startup; the source of truth for every request
+store = TodoStore(make_backend(), flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD,
+                  shared=SHARED, journal_size=JOURNAL_SIZE)
+
+# Frontend assets, hashed and compressed once at startup; the page is
+# rendered with their hashed URLs and cached the same way
+assets = AssetBundle(os.path.join(app.root_path, 'static'))
+assets.add('index.html', app.jinja_env.get_template('index.html').render(asset_url=assets.url).encode(),
+           hashed=False)
+
+compressor = ResponseCompressor(min_size=COMPRESS_MIN_SIZE, gzip_level=GZIP_LEVEL,
+                                brotli_quality=BROTLI_QUALITY, zstd_level=ZSTD_LEVEL)
+compressor.init_app(app)
+
+# Set once the server has been asked to shut down; /readyz then reports 503
+# so load balancers stop routing here while in-flight requests finish
+draining = threading.Event()
+
+# Free change stream slots (None: unlimited), and the wakeup events of the
+# streams that are open
+stream_slots = None
+_stream_wakeups = set()
+
+def limit_streams(count):
+    """Allow at most ``count`` open change streams (None: no limit)"""
+    global stream_slots
+    stream_slots = None if count is None else threading.BoundedSemaphore(count)
+
+def drain():
+    """Start shutting down: report not ready and end open change streams"""
+    draining.set()
+    for wakeup in list(_stream_wakeups):
+        wakeup.set()
+
+limit_streams(MAX_STREAMS)
 
 @app.route('/')
 def index():
-"""Serve the main page with embedded CSS and JS"""
-return '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Prinsons App</title>
-<style>
-/ Reset and Base Styles /
-* {
-margin: 0;
-padding: 0;
-box-sizing: border-box;
-}
-
-  1
-  2
-  3
-  4
-  5
-  6
-  7
-  8
-  9
- 10
- 11
- 12
- 13
- 14
- 15
- 16
- 17
- 18
- 19
- 20
- 21
- 22
- 23
- 24
- 25
- 26
- 27
- 28
- 29
- 30
- 31
- 32
- 33
- 34
- 35
- 36
- 37
- 38
- 39
- 40
- 41
- 42
- 43
- 44
- 45
- 46
- 47
- 48
- 49
- 50
- 51
- 52
- 53
- 54
- 55
- 56
- 57
- 58
- 59
- 60
- 61
- 62
- 63
- 64
- 65
- 66
- 67
- 68
- 69
- 70
- 71
- 72
- 73
- 74
- 75
- 76
- 77
- 78
- 79
- 80
- 81
- 82
- 83
- 84
- 85
- 86
- 87
- 88
- 89
- 90
- 91
- 92
- 93
- 94
- 95
- 96
- 97
- 98
- 99
-100
-101
-102
-103
-104
-105
-106
-107
-108
-109
-110
-111
-112
-113
-114
-115
-116
-117
-118
-119
-120
-121
-122
-123
-124
-125
-126
-127
-128
-129
-130
-131
-132
-133
-134
-135
-136
-137
-138
-139
-140
-141
-142
-143
-144
-145
-146
-147
-148
-149
-150
-151
-152
-153
-154
-155
-156
-157
-158
-159
-160
-161
-162
-163
-164
-165
-166
-167
-168
-169
-170
-171
-172
-173
-174
-175
-176
-177
-178
-179
-180
-181
-182
-183
-184
-185
-186
-187
-188
-189
-190
-191
-192
-193
-194
-195
-196
-197
-198
-199
-200
-201
-202
-203
-204
-205
-206
-207
-208
-209
-210
-211
-212
-213
-214
-215
-216
-217
-218
-219
-220
-221
-222
-223
-224
-225
-226
-227
-228
-229
-230
-231
-232
-233
-234
-235
-236
-237
-238
-239
-240
-241
-242
-243
-244
-245
-246
-247
-248
-249
-250
-251
-252
-253
-254
-255
-256
-257
-258
-259
-260
-261
-262
-263
-264
-265
-266
-267
-268
-269
-270
-271
-272
-273
-274
-275
-276
-277
-278
-279
-280
-281
-282
-283
-284
-285
-286
-287
-288
-289
-290
-291
-292
-293
-294
-295
-296
-297
-298
-299
-300
-301
-302
-303
-304
-305
-306
-307
-308
-309
-310
-311
-312
-313
-314
-315
-316
-317
-318
-319
-320
-321
-322
-323
-324
-325
-326
-327
-328
-329
-330
-331
-332
-333
-334
-335
-336
-337
-338
-339
-340
-341
-342
-343
-344
-345
-346
-347
-348
-349
-350
-351
-352
-353
-354
-355
-356
-357
-358
-359
-360
-361
-362
-    body {
-        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        line-height: 1.6;
-        color: #333;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        min-height: 100vh;
-        padding: 20px;
-    }
-
-    .container {
-        max-width: 600px;
-        margin: 0 auto;
-        background: white;
-        border-radius: 15px;
-        box-shadow: 0 20px 40px rgba(0, 0, 0, 0.1);
-        overflow: hidden;
-    }
-
-    /* Header */
-    header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        text-align: center;
-        padding: 30px 20px;
-    }
-
-    header h1 {
-        font-size: 2.5em;
-        font-weight: 300;
-        margin: 0;
-    }
-
-    /* Main Content */
-    main {
-        padding: 30px;
-    }
-
-    /* Todo Input Section */
-    .todo-input-section {
-        margin-bottom: 30px;
-    }
-
-    .input-group {
-        display: flex;
-        gap: 10px;
-        margin-bottom: 20px;
-    }
-
-    #todoInput {
-        flex: 1;
-        padding: 15px 20px;
-        border: 2px solid #e1e8ed;
-        border-radius: 25px;
-        font-size: 16px;
-        outline: none;
-        transition: all 0.3s ease;
-    }
-
-    #todoInput:focus {
-        border-color: #667eea;
-        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.1);
-    }
-
-    #addBtn {
-        padding: 15px 30px;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        font-size: 16px;
-        font-weight: 600;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        min-width: 80px;
-    }
-
-    #addBtn:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 15px rgba(102, 126, 234, 0.3);
-    }
-
-    #addBtn:disabled {
-        opacity: 0.6;
-        cursor: not-allowed;
-        transform: none;
-    }
-
-    /* Filter Section */
-    .filter-section {
-        display: flex;
-        justify-content: center;
-        gap: 10px;
-        margin-bottom: 30px;
-    }
-
-    .filter-btn {
-        padding: 10px 20px;
-        border: 2px solid #e1e8ed;
-        background: white;
-        border-radius: 20px;
-        cursor: pointer;
-        transition: all 0.3s ease;
-        font-size: 14px;
-        font-weight: 500;
-    }
-
-    .filter-btn:hover {
-        border-color: #667eea;
-        color: #667eea;
-    }
-
-    .filter-btn.active {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border-color: transparent;
-    }
-
-    /* Todo List */
-    .todo-list {
-        list-style: none;
-        margin-bottom: 30px;
-    }
-
-    .todo-item {
-        display: flex;
-        align-items: center;
-        padding: 15px 0;
-        border-bottom: 1px solid #f0f0f0;
-        transition: all 0.3s ease;
-    }
-
-    .todo-item:hover {
-        background: #f8f9fa;
-        margin: 0 -15px;
-        padding-left: 15px;
-        padding-right: 15px;
-        border-radius: 10px;
-    }
-
-    .todo-item.completed {
-        opacity: 0.6;
-    }
-
-    .todo-item.completed .todo-text {
-        text-decoration: line-through;
-        color: #888;
-    }
-
-    .todo-checkbox {
-        width: 20px;
-        height: 20px;
-        border: 2px solid #ddd;
-        border-radius: 50%;
-        margin-right: 15px;
-        cursor: pointer;
-        position: relative;
-        transition: all 0.3s ease;
-        flex-shrink: 0;
-    }
-
-    .todo-checkbox:hover {
-        border-color: #667eea;
-    }
-
-    .todo-checkbox.checked {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-color: #667eea;
-    }
-
-    .todo-checkbox.checked::after {
-        content: '✓';
-        position: absolute;
-        top: 50%;
-        left: 50%;
-        transform: translate(-50%, -50%);
-        color: white;
-        font-size: 12px;
-        font-weight: bold;
-    }
-
-    .todo-text {
-        flex: 1;
-        font-size: 16px;
-        line-height: 1.4;
-        word-wrap: break-word;
-        cursor: pointer;
-    }
-
-    .todo-text:hover {
-        color: #667eea;
-    }
-
-    .todo-actions {
-        display: flex;
-        gap: 10px;
-        opacity: 0;
-        transition: opacity 0.3s ease;
-    }
-
-    .todo-item:hover .todo-actions {
-        opacity: 1;
-    }
-
-    .todo-btn {
-        padding: 8px 12px;
-        border: none;
-        border-radius: 15px;
-        cursor: pointer;
-        font-size: 12px;
-        font-weight: 500;
-        transition: all 0.3s ease;
-    }
-
-    .edit-btn {
-        background: #17a2b8;
-        color: white;
-    }
-
-    .edit-btn:hover {
-        background: #138496;
-        transform: translateY(-1px);
-    }
-
-    .delete-btn {
-        background: #dc3545;
-        color: white;
-    }
-
-    .delete-btn:hover {
-        background: #c82333;
-        transform: translateY(-1px);
-    }
-
-    /* Todo Footer */
-    .todo-footer {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding-top: 20px;
-        border-top: 1px solid #e1e8ed;
-    }
-
-    .todo-stats {
-        color: #666;
-        font-size: 14px;
-    }
+    """Serve the main page"""
+    return assets.send('index.html')
 
-    .clear-btn {
-        padding: 10px 20px;
-        background: #dc3545;
-        color: white;
-        border: none;
-        border-radius: 20px;
-        cursor: pointer;
-        font-size: 14px;
-        transition: all 0.3s ease;
-    }
-
-    .clear-btn:hover {
-        background: #c82333;
-        transform: translateY(-1px);
-    }
-
-    .clear-btn:disabled {
-        opacity: 0.5;
-        cursor: not-allowed;
-        transform: none;
-    }
-
-    /* Edit Mode */
-    .todo-edit-input {
-        flex: 1;
-        padding: 8px 15px;
-        border: 2px solid #667eea;
-        border-radius: 20px;
-        font-size: 16px;
-        outline: none;
-        margin-right: 10px;
-    }
-
-    .save-btn {
-        background: #28a745;
-        color: white;
-    }
-
-    .save-btn:hover {
-        background: #218838;
-    }
-
-    .cancel-btn {
-        background: #6c757d;
-        color: white;
-    }
-
-    .cancel-btn:hover {
-        background: #5a6268;
-    }
-
-    /* Utility Classes */
-    .hidden {
-        display: none;
-    }
-
-    .loading {
-        text-align: center;
-        padding: 20px;
-        color: #666;
-        font-style: italic;
-    }
-
-    .error-message {
-        background: #f8d7da;
-        color: #721c24;
-        padding: 15px;
-        border-radius: 10px;
-        margin: 20px 0;
-        border: 1px solid #f5c6cb;
-    }
-
-    .empty-state {
-        text-align: center;
-        padding: 60px 20px;
-        color: #666;
-    }
-
-    .empty-state h3 {
-        font-size: 1.5em;
-        margin-bottom: 10px;
-        color: #333;
-    }
-
-    /* Responsive Design */
-    @media (max-width: 768px) {
-        .container {
-            margin: 0;
-            border-radius: 0;
-            min-height: 100vh;
-        }
-
-        header h1 {
-            font-size: 2em;
-        }
-
-        main {
-            padding: 20px;
-        }
-
-        .input-group {
-            flex-direction: column;
-        }
-
-        .filter-section {
-            flex-wrap: wrap;
-        }
-
-        .todo-footer {
-            flex-direction: column;
-            gap: 15px;
-            text-align: center;
-        }
-    }
-</style>
-</head>
-<body>
-<div class="container">
-<header>
-<h1>📝 My To-Do List</h1>
-</header>
-
-  1
-  2
-  3
-  4
-  5
-  6
-  7
-  8
-  9
- 10
- 11
- 12
- 13
- 14
- 15
- 16
- 17
- 18
- 19
- 20
- 21
- 22
- 23
- 24
- 25
- 26
- 27
- 28
- 29
- 30
- 31
- 32
- 33
- 34
- 35
- 36
- 37
- 38
- 39
- 40
- 41
- 42
- 43
- 44
- 45
- 46
- 47
- 48
- 49
- 50
- 51
- 52
- 53
- 54
- 55
- 56
- 57
- 58
- 59
- 60
- 61
- 62
- 63
- 64
- 65
- 66
- 67
- 68
- 69
- 70
- 71
- 72
- 73
- 74
- 75
- 76
- 77
- 78
- 79
- 80
- 81
- 82
- 83
- 84
- 85
- 86
- 87
- 88
- 89
- 90
- 91
- 92
- 93
- 94
- 95
- 96
- 97
- 98
- 99
-100
-101
-102
-103
-104
-105
-106
-107
-108
-109
-110
-111
-112
-113
-114
-115
-116
-117
-118
-119
-120
-121
-122
-123
-124
-125
-126
-127
-128
-129
-130
-131
-132
-133
-134
-135
-136
-137
-138
-139
-140
-141
-142
-143
-144
-145
-146
-147
-148
-149
-150
-151
-152
-153
-154
-155
-156
-157
-158
-159
-160
-161
-162
-163
-164
-165
-166
-167
-168
-169
-170
-171
-172
-173
-174
-175
-176
-177
-178
-179
-180
-181
-182
-183
-184
-185
-186
-187
-188
-189
-190
-191
-192
-193
-194
-195
-196
-197
-198
-199
-200
-201
-202
-203
-204
-205
-206
-207
-208
-209
-210
-211
-212
-213
-214
-215
-216
-217
-218
-219
-220
-221
-222
-223
-224
-225
-226
-227
-228
-229
-230
-231
-232
-233
-234
-235
-236
-237
-238
-239
-240
-241
-242
-243
-244
-245
-246
-247
-248
-249
-250
-251
-252
-253
-254
-255
-256
-257
-258
-259
-260
-261
-262
-263
-264
-265
-266
-267
-268
-269
-270
-271
-272
-273
-274
-275
-276
-277
-278
-279
-280
-281
-282
-283
-284
-285
-286
-287
-288
-289
-290
-291
-292
-293
-294
-295
-296
-297
-298
-299
-300
-301
-302
-303
-304
-305
-    <main>
-        <!-- Add Todo Form -->
-        <div class="todo-input-section">
-            <div class="input-group">
-                <input type="text" id="todoInput" placeholder="What needs to be done?" maxlength="100">
-                <button id="addBtn" onclick="addTodo()">Add</button>
-            </div>
-        </div>
-
-        <!-- Filter Buttons -->
-        <div class="filter-section">
-            <button class="filter-btn active" onclick="filterTodos('all', this)">All</button>
-            <button class="filter-btn" onclick="filterTodos('active', this)">Active</button>
-            <button class="filter-btn" onclick="filterTodos('completed', this)">Completed</button>
-        </div>
-
-        <!-- Todo List -->
-        <div class="todos-section">
-            <ul id="todoList" class="todo-list">
-                <!-- Todos will be inserted here by JavaScript -->
-            </ul>
-        </div>
-
-        <!-- Todo Stats and Actions -->
-        <div class="todo-footer">
-            <div class="todo-stats">
-                <span id="todoCount">0 items left</span>
-            </div>
-            <div class="todo-actions">
-                <button id="clearCompleted" onclick="clearCompleted()" class="clear-btn">
-                    Clear Completed
-                </button>
-            </div>
-        </div>
-    </main>
-
-    <!-- Loading indicator -->
-    <div id="loading" class="loading hidden">Loading...</div>
-
-    <!-- Error message -->
-    <div id="errorMessage" class="error-message hidden"></div>
-</div>
-
-<script>
-    // Global variables
-    let todos = [];
-    let currentFilter = 'all';
-    let editingId = null;
-
-    // DOM elements
-    const todoInput = document.getElementById('todoInput');
-    const todoList = document.getElementById('todoList');
-    const todoCount = document.getElementById('todoCount');
-    const addBtn = document.getElementById('addBtn');
-    const clearCompletedBtn = document.getElementById('clearCompleted');
-    const loadingDiv = document.getElementById('loading');
-    const errorDiv = document.getElementById('errorMessage');
-
-    // Initialize app
-    document.addEventListener('DOMContentLoaded', function() {
-        loadTodos();
-        setupEventListeners();
-    });
-
-    // Event listeners
-    function setupEventListeners() {
-        // Add todo on Enter key press
-        todoInput.addEventListener('keypress', function(e) {
-            if (e.key === 'Enter') {
-                addTodo();
-            }
-        });
-
-        // Enable/disable add button based on input
-        todoInput.addEventListener('input', function() {
-            addBtn.disabled = !todoInput.value.trim();
-        });
-    }
-
-    // API functions
-    async function apiCall(url, options = {}) {
-        try {
-            showLoading(true);
-            const response = await fetch(url, {
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...options.headers
-                },
-                ...options
-            });
-
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.error || 'Something went wrong');
-            }
-
-            return await response.json();
-        } catch (error) {
-            showError(error.message);
-            throw error;
-        } finally {
-            showLoading(false);
-        }
-    }
-
-    // Load todos from server
-    async function loadTodos() {
-        try {
-            todos = await apiCall('/api/todos');
-            renderTodos();
-            updateStats();
-        } catch (error) {
-            console.error('Failed to load todos:', error);
-        }
-    }
-
-    // Add new todo
-    async function addTodo() {
-        const text = todoInput.value.trim();
-        if (!text) return;
-
-        try {
-            const newTodo = await apiCall('/api/todos', {
-                method: 'POST',
-                body: JSON.stringify({ text })
-            });
-
-            todos.push(newTodo);
-            todoInput.value = '';
-            addBtn.disabled = true;
-            renderTodos();
-            updateStats();
-            hideError();
-        } catch (error) {
-            console.error('Failed to add todo:', error);
-        }
-    }
-
-    // Toggle todo completion
-    async function toggleTodo(id) {
-        const todo = todos.find(t => t.id === id);
-        if (!todo) return;
-
-        try {
-            const updatedTodo = await apiCall(`/api/todos/${id}`, {
-                method: 'PUT',
-                body: JSON.stringify({ completed: !todo.completed })
-            });
-
-            // Update local todos array
-            const index = todos.findIndex(t => t.id === id);
-            todos[index] = updatedTodo;
-
-            renderTodos();
-            updateStats();
-        } catch (error) {
-            console.error('Failed to toggle todo:', error);
-        }
-    }
-
-    // Delete todo
-    async function deleteTodo(id) {
-        try {
-            await apiCall(`/api/todos/${id}`, {
-                method: 'DELETE'
-            });
-
-            // Remove from local array
-            todos = todos.filter(t => t.id !== id);
-            renderTodos();
-            updateStats();
-        } catch (error) {
-            console.error('Failed to delete todo:', error);
-        }
-    }
-
-    // Clear completed todos
-    async function clearCompleted() {
-        if (!todos.some(t => t.completed)) return;
-
-        try {
-            await apiCall('/api/todos/clear-completed', {
-                method: 'DELETE'
-            });
-
-            // Remove completed todos from local array
-            todos = todos.filter(t => !t.completed);
-            renderTodos();
-            updateStats();
-        } catch (error) {
-            console.error('Failed to clear completed todos:', error);
-        }
-    }
-
-    // Filter todos
-    function filterTodos(filter, button) {
-        currentFilter = filter;
-
-        // Update filter buttons
-        document.querySelectorAll('.filter-btn').forEach(btn => {
-            btn.classList.remove('active');
-        });
-        button.classList.add('active');
-
-        renderTodos();
-    }
-
-    // Get filtered todos
-    function getFilteredTodos() {
-        switch (currentFilter) {
-            case 'active':
-                return todos.filter(t => !t.completed);
-            case 'completed':
-                return todos.filter(t => t.completed);
-            default:
-                return todos;
-        }
-    }
-
-    // Render todos
-    function renderTodos() {
-        const filteredTodos = getFilteredTodos();
-
-        if (filteredTodos.length === 0) {
-            renderEmptyState();
-            return;
-        }
-
-        todoList.innerHTML = filteredTodos.map(todo => createTodoHTML(todo)).join('');
-    }
-
-    // Create HTML for a todo item
-    function createTodoHTML(todo) {
-        return `
-            <li class="todo-item ${todo.completed ? 'completed' : ''}" data-id="${todo.id}">
-                <div class="todo-checkbox ${todo.completed ? 'checked' : ''}" 
-                     onclick="toggleTodo(${todo.id})"></div>
-                <div class="todo-text">${escapeHtml(todo.text)}</div>
-                <div class="todo-actions">
-                    <button class="todo-btn delete-btn" onclick="deleteTodo(${todo.id})">Delete</button>
-                </div>
-            </li>
-        `;
-    }
-
-    // Render empty state
-    function renderEmptyState() {
-        const messages = {
-            all: {
-                title: "No todos yet!",
-                text: "Add your first todo above to get started."
-            },
-            active: {
-                title: "No active todos!",
-                text: "All your todos are completed. Great job! 🎉"
-            },
-            completed: {
-                title: "No completed todos!",
-                text: "Complete some todos to see them here."
-            }
-        };
-
-        const message = messages[currentFilter];
-        todoList.innerHTML = `
-            <div class="empty-state">
-                <h3>${message.title}</h3>
-                <p>${message.text}</p>
-            </div>
-        `;
-    }
-
-    // Update stats
-    function updateStats() {
-        const activeTodos = todos.filter(t => !t.completed).length;
-        const completedTodos = todos.filter(t => t.completed).length;
-
-        todoCount.textContent = `${activeTodos} ${activeTodos === 1 ? 'item' : 'items'} left`;
-
-        // Enable/disable clear completed button
-        clearCompletedBtn.disabled = completedTodos === 0;
-    }
-
-    // Utility functions
-    function escapeHtml(text) {
-        const div = document.createElement('div');
-        div.textContent = text;
-        return div.innerHTML;
-    }
-
-    function showLoading(show) {
-        loadingDiv.classList.toggle('hidden', !show);
-    }
-
-    function showError(message) {
-        errorDiv.textContent = message;
-        errorDiv.classList.remove('hidden');
-
-        // Auto-hide error after 5 seconds
-        setTimeout(hideError, 5000);
-    }
-
-    function hideError() {
-        errorDiv.classList.add('hidden');
-    }
-</script>
-</body>
-</html>
-'''
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve a CSS/JS asset, content-hashed and precompressed"""
+    return assets.send(filename)
 
 @app.route('/api/todos', methods=['GET'])
 def get_todos():
-"""Get all todos"""
-todos = load_todos()
-return jsonify(todos)
+    """Get todos, optionally one page at a time.
+
+    ``limit`` caps the page size and ``cursor`` continues after the given
+    id; the cursor for the next page comes back in ``X-Next-Cursor``.
+    ``fields`` is a comma-separated list of fields to include, and
+    ``status`` (all, active or completed) filters by completion.
+
+    ``created_after`` and ``created_before`` (ISO timestamps, exclusive)
+    select a range of creation times and ``order`` (oldest or newest)
+    sorts by creation time; these use the store's created_at index, and
+    their cursors are opaque strings rather than ids.
+
+    Without ``limit`` or ``cursor`` the whole list is streamed, fetched
+    from the store and encoded STREAM_CHUNK todos at a time, so memory use
+    does not grow with the list. The response carries a weak ETag for the
+    collection version; a matching If-None-Match gets a 304 without the
+    list being built.
+    """
+    # Read before the todos, so a concurrent write can only make the tag stale
+    etag = store.current_version()
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    try:
+        limit = _query_arg('limit', _positive_int)
+        fields = _query_arg('fields', _field_list)
+        status = _query_arg('status', _status)
+        order = _query_arg('order', _order)
+        since = _query_arg('created_after', _timestamp)
+        until = _query_arg('created_before', _timestamp)
+        by_created = order is not None or since is not None or until is not None
+        cursor = _query_arg('cursor', _created_cursor if by_created else _integer)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    completed = STATUSES[status or 'all']
+    created = {'since': since, 'until': until, 'newest': order == 'newest'} if by_created else {}
+    if limit is None and cursor is None:
+        chunks = store.chunks(completed=completed, size=STREAM_CHUNK, **created)
+        response = app.response_class(_json_array(chunks, fields), mimetype='application/json')
+        return _revalidate(response, etag, weak=True)
+
+    limit = min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    if by_created:
+        todos, next_cursor = store.created_page(after=cursor, limit=limit, completed=completed, **created)
+    else:
+        todos, next_cursor = store.page(after=cursor, limit=limit, completed=completed)
+
+    if fields:
+        todos = [_project(t, fields) for t in todos]
+
+    response = jsonify(todos)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = '%d:%d' % next_cursor if by_created else str(next_cursor)
+    return _revalidate(response, etag, weak=True)
+
+def _json_array(chunks, fields=None):
+    """Encode lists of todos as one JSON array, a chunk at a time"""
+    yield b'['
+    separator = b''
+    for todos in chunks:
+        if fields:
+            todos = [_project(t, fields) for t in todos]
+        if todos:
+            # One encoder call per chunk; strip the brackets of the list
+            yield separator + codec.dumps(todos)[1:-1]
+            separator = b','
+    yield b']'
+
+def _project(todo, fields):
+    data = todo.to_dict()
+    return {f: data[f] for f in fields}
+
+@app.route('/api/todos/<int:todo_id>', methods=['GET'])
+def get_todo(todo_id):
+    """Get one todo, with a strong ETag usable in If-Match"""
+    todo = store.get(todo_id)
+    if not todo:
+        return jsonify({'error': 'Todo not found'}), 404
+
+    etag = todo_etag(todo)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    return _revalidate(jsonify(todo), etag)
+
+def _revalidate(response, etag, weak=False):
+    """Tag a response and ask clients to revalidate before reusing it"""
+    response.set_etag(etag, weak=weak)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _not_modified(etag, weak=False):
+    return _revalidate(app.response_class(status=304), etag, weak=weak)
+
+def _if_match():
+    """Turn an If-Match header into a precondition for the store"""
+    if not request.if_match:
+        return None
+    return lambda todo: request.if_match.contains(todo_etag(todo))
+
+def _query_arg(name, convert):
+    """Convert query parameter ``name``, or return None when it is absent"""
+    value = request.args.get(name)
+    return None if value is None else convert(name, value)
+
+def _integer(name, value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer') from None
+
+def _positive_int(name, value):
+    value = _integer(name, value)
+    if value < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return value
+
+def _field_list(name, value):
+    fields = [f for f in value.split(',') if f]
+    unknown = [f for f in fields if f not in TODO_FIELDS]
+    if unknown:
+        raise ValueError('Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+def _status(name, value):
+    if value not in STATUSES:
+        raise ValueError(f'{name} must be one of: ' + ', '.join(STATUSES))
+    return value
+
+def _order(name, value):
+    if value not in ORDERS:
+        raise ValueError(f'{name} must be one of: ' + ', '.join(ORDERS))
+    return value
+
+def _timestamp(name, value):
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 timestamp') from None
+
+def _created_cursor(name, value):
+    """Parse the ``created_at:id`` cursor of a creation-ordered listing"""
+    created_at, _, todo_id = value.partition(':')
+    try:
+        return int(created_at), int(todo_id)
+    except ValueError:
+        raise ValueError(f'{name} is not a cursor for this ordering') from None
+
+@app.route('/api/todos/search', methods=['GET'])
+def search_todos():
+    """Find todos whose text has every word of ``q``, best match first.
+
+    Words are case-insensitive and match as prefixes too, so ``q=gro``
+    finds "Groceries"; rarer words and whole-word matches rank higher.
+    ``limit`` (at most MAX_PAGE_SIZE) and ``status`` work as for
+    GET /api/todos. A word that is the start of too many different words
+    (say, a single letter) gets a 400 rather than partial results.
+    """
+    try:
+        query = _query_arg('q', _search_query)
+        limit = _query_arg('limit', _positive_int)
+        status = _query_arg('status', _status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if query is None:
+        return jsonify({'error': 'q is required'}), 400
+
+    limit = min(limit or SEARCH_LIMIT, MAX_PAGE_SIZE)
+    try:
+        todos = store.search(query, limit=limit, completed=STATUSES[status or 'all'])
+    except QueryTooBroad as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(todos)
+
+def _search_query(name, value):
+    if not value.strip():
+        raise ValueError(f'{name} must not be empty')
+    return value
+
+@app.route('/api/todos/changes', methods=['GET'])
+def get_changes():
+    """Get what changed since the version in ``since``.
+
+    Versions are the ETag values of GET /api/todos (without W/ and
+    quotes) or the ``version`` of a previous call. When ``since`` is
+    missing or too old to answer from the change journal, the response
+    is a snapshot of all todos instead.
+    """
+    return jsonify(store.changes_since(request.args.get('since')))
+
+@app.route('/api/todos/stream', methods=['GET'])
+def stream_todos():
+    """Push changes to the todos as Server-Sent Events.
+
+    Each created/updated todo is sent as a ``created``/``updated`` event
+    with the todo as data, and each deleted id as a ``deleted`` event.
+    The last event of every burst carries the collection version as its
+    id, so a reconnecting EventSource resumes through Last-Event-ID (or
+    ``since`` on the first connect). A ``reset`` event means the client
+    is too far behind and should reload.
+
+    The store only sets one event per subscriber on each change; there is
+    no per-client queue. Under a threaded WSGI server each open stream
+    still holds a worker thread while it waits, so past MAX_STREAMS open
+    streams (and while draining) the answer is a 503 and clients poll
+    /api/todos/changes instead; asgi.py serves this route on its event
+    loop without that cost. Draining also ends the open streams, and
+    EventSource reconnects elsewhere.
+    """
+    if draining.is_set():
+        return jsonify({'error': 'Shutting down'}), 503
+    slots = stream_slots
+    if slots is not None and not slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many open change streams; poll /api/todos/changes'}), 503
+    try:
+        version = request.headers.get('Last-Event-ID') or request.args.get('since') or store.current_version()
+        response = Response(_change_events(version), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    except BaseException:
+        if slots is not None:
+            slots.release()
+        raise
+    if slots is not None:
+        # The server closes the response however the stream ends
+        response.call_on_close(slots.release)
+    return response
+
+def _change_events(version):
+    wakeup = threading.Event()
+    store.subscribe(wakeup.set)
+    _stream_wakeups.add(wakeup)
+    try:
+        yield 'retry: 3000\n\n'
+        while not draining.is_set():
+            # Streams only send a reset, never the snapshot itself
+            changes = store.changes_since(version, todos=False)
+            version = changes['version']
+            events = _format_changes(changes)
+            if events:
+                yield events
+            if not wakeup.wait(STREAM_KEEPALIVE):
+                yield ': keep-alive\n\n'
+            wakeup.clear()
+    finally:
+        _stream_wakeups.discard(wakeup)
+        store.unsubscribe(wakeup.set)
+
+def _format_changes(changes):
+    """Render a changes_since() result as SSE events"""
+    if changes.get('snapshot'):
+        events = [('reset', {'version': changes['version']})]
+    else:
+        events = [('created', todo) for todo in changes['created']]
+        events += [('updated', todo) for todo in changes['updated']]
+        events += [('deleted', {'id': todo_id}) for todo_id in changes['deleted']]
+
+    chunks = []
+    for i, (event, data) in enumerate(events):
+        chunk = f'event: {event}\ndata: {app.json.dumps(data)}\n'
+        if i == len(events) - 1:
+            chunk += f'id: {changes["version"]}\n'
+        chunks.append(chunk + '\n')
+    return ''.join(chunks)
+
+@app.route('/api/todos/stats', methods=['GET'])
+def get_stats():
+    """Count all, active and completed todos"""
+    return jsonify(store.stats())
 
 @app.route('/api/todos', methods=['POST'])
 def add_todo():
-"""Add a new todo"""
-data = request.get_json()
-
- 1
- 2
- 3
- 4
- 5
- 6
- 7
- 8
- 9
-10
-11
-12
-13
-14
-15
-16
-17
-if not data or 'text' not in data:
-    return jsonify({'error': 'Todo text is required'}), 400
-
-todos = load_todos()
-
-# Create new todo with unique ID
-new_todo = {
-    'id': len(todos) + 1,
-    'text': data['text'].strip(),
-    'completed': False,
-    'created_at': datetime.now().isoformat()
-}
-
-todos.append(new_todo)
-save_todos(todos)
-
-return jsonify(new_todo), 201
+    """Add a new todo"""
+    data = request.get_json()
+
+    if not data or 'text' not in data:
+        return jsonify({'error': 'Todo text is required'}), 400
+    try:
+        text = _todo_text(data['text'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    new_todo = store.add(text)
+    return jsonify(new_todo), 201
+
 @app.route('/api/todos/<int:todo_id>', methods=['PUT'])
 def update_todo(todo_id):
-"""Update a todo (toggle completion or edit text)"""
-data = request.get_json()
-todos = load_todos()
-
- 1
- 2
- 3
- 4
- 5
- 6
- 7
- 8
- 9
-10
-11
-12
-13
-# Find the todo
-todo = next((t for t in todos if t['id'] == todo_id), None)
-if not todo:
-    return jsonify({'error': 'Todo not found'}), 404
-
-# Update fields if provided
-if 'completed' in data:
-    todo['completed'] = data['completed']
-if 'text' in data:
-    todo['text'] = data['text'].strip()
-
-save_todos(todos)
-return jsonify(todo)
+    """Update a todo (toggle completion or edit text)"""
+    data = request.get_json()
+    try:
+        changes = _todo_changes(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        todo = store.update(todo_id, changes, precondition=_if_match())
+    except PreconditionFailed:
+        return jsonify({'error': 'Todo was modified by someone else'}), 412
+    if not todo:
+        return jsonify({'error': 'Todo not found'}), 404
+
+    response = jsonify(todo)
+    response.set_etag(todo_etag(todo))
+    return response
+
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
-"""Delete a todo"""
-todos = load_todos()
-
-1
-2
-3
-4
-5
-6
-7
-8
-# Filter out the todo to delete
-updated_todos = [t for t in todos if t['id'] != todo_id]
-
-if len(updated_todos) == len(todos):
-    return jsonify({'error': 'Todo not found'}), 404
-
-save_todos(updated_todos)
-return jsonify({'message': 'Todo deleted successfully'})
+    """Delete a todo"""
+    try:
+        deleted = store.delete(todo_id, precondition=_if_match())
+    except PreconditionFailed:
+        return jsonify({'error': 'Todo was modified by someone else'}), 412
+    if not deleted:
+        return jsonify({'error': 'Todo not found'}), 404
+
+    return jsonify({'message': 'Todo deleted successfully'})
+
 @app.route('/api/todos/clear-completed', methods=['DELETE'])
 def clear_completed():
-"""Delete all completed todos"""
-todos = load_todos()
-active_todos = [t for t in todos if not t['completed']]
-save_todos(active_todos)
-return jsonify({'message': 'Completed todos cleared'})
-
-if name == 'main':
-print("Starting Todo App...")
-print("Visit: http://127.0.0.1:8080")
-app.run(debug=True, host='127.0.0.1', port=8080)
\ No newline at end of file
+    """Delete all completed todos"""
+    store.clear_completed()
+    return jsonify({'message': 'Completed todos cleared'})
+
+@app.route('/api/todos/batch', methods=['POST'])
+def batch_todos():
+    """Apply a list of create/update/delete operations all-or-nothing.
+
+    Each operation is an object with ``op`` set to create (with ``text``),
+    update (with ``id`` and ``completed`` and/or ``text``) or delete (with
+    ``id``). Changes are written to disk once for the whole batch. If any
+    operation is invalid or names a missing todo, nothing is applied and
+    the error carries that operation's ``index``.
+    """
+    data = request.get_json()
+    if not isinstance(data, list):
+        return jsonify({'error': 'Expected a list of operations'}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} operations per batch'}), 400
+
+    operations = []
+    for index, item in enumerate(data):
+        try:
+            operations.append(_batch_operation(item))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'index': index}), 400
+
+    try:
+        todos = store.batch(operations)
+    except BatchError as e:
+        return jsonify({'error': str(e), 'index': e.index}), 404
+
+    results = []
+    for (op, *args), todo in zip(operations, todos):
+        if op == 'delete':
+            results.append({'op': op, 'status': 200, 'id': args[0]})
+        else:
+            results.append({'op': op, 'status': 201 if op == 'create' else 200, 'todo': todo})
+    return jsonify({'results': results})
+
+def _batch_operation(item):
+    """Validate one batch item into the tuple TodoStore.batch() expects"""
+    if not isinstance(item, dict):
+        raise ValueError('Each operation must be an object')
+    op = item.get('op')
+    if op == 'create':
+        if 'text' not in item:
+            raise ValueError('Todo text is required')
+        return 'create', _todo_text(item['text'])
+    if op not in ('update', 'delete'):
+        raise ValueError("op must be one of: create, update, delete")
+    # bool is an int subclass, but true is not an id
+    if not isinstance(item.get('id'), int) or isinstance(item['id'], bool):
+        raise ValueError('id must be an integer')
+    if op == 'update':
+        return 'update', item['id'], _todo_changes(item)
+    return 'delete', item['id']
+
+def _todo_changes(data):
+    """Pick the fields a todo update may change, raising ValueError if invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    # Update fields if provided
+    changes = {}
+    if 'completed' in data:
+        if not isinstance(data['completed'], bool):
+            raise ValueError('completed must be true or false')
+        changes['completed'] = data['completed']
+    if 'text' in data:
+        changes['text'] = _todo_text(data['text'])
+    return changes
+
+def _todo_text(value):
+    if not isinstance(value, str):
+        raise ValueError('Todo text must be a string')
+    return value.strip()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and answering requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the store is loaded and we are not shutting down"""
+    if draining.is_set() or store.closed:
+        return jsonify({'status': 'draining'}), 503
+    return jsonify({'status': 'ready', 'todos': store.stats()['total']})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-process counters in the Prometheus text format"""
+    names = {
+        'responses': 'todos_api_responses_total',
+        'bytes_in': 'todos_api_response_bytes_uncompressed_total',
+        'bytes_out': 'todos_api_response_bytes_sent_total',
+    }
+    stats = sorted(compressor.snapshot().items())
+    lines = []
+    for key, name in names.items():
+        lines.append(f'# TYPE {name} counter')
+        for (counter, encoding), value in stats:
+            if counter == key:
+                lines.append(f'{name}{{encoding="{encoding}"}} {value}')
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.cli.command('import-json')
+@click.argument('source', default=TODOS_FILE)
+def import_json(source):
+    """Copy the todos in a JSON file into the SQLite database (TODOS_DB)"""
+    todos, _ = load_todos(source)
+    backend = SQLiteBackend(TODOS_DB)
+    try:
+        backend.import_todos(todos)
+    finally:
+        backend.close()
+    click.echo(f"Imported {len(todos)} todos from {source} into {TODOS_DB}")
+
+@app.cli.command('convert-snapshot')
+@click.argument('source', default=TODOS_FILE)
+@click.argument('dest', required=False)
+@click.option('--to', 'target', type=click.Choice(['json', 'binary']), required=True,
+              help='Format to write.')
+@click.option('--pretty/--compact', default=JSON_PRETTY, help='Indent JSON output.')
+def convert_snapshot(source, dest, target, pretty):
+    """Rewrite a todos file (JSON or binary) in the other format.
+
+    DEST defaults to SOURCE, replaced atomically. Stop the server first, or
+    point DEST elsewhere: a running store keeps writing in its own format.
+    """
+    todos, next_id = load_todos(source)
+    save_todos(todos, next_id, dest or source, pretty=pretty, binary=target == 'binary')
+    click.echo(f"Wrote {len(todos)} todos from {source} to {dest or source} as {target}")
+
+@app.cli.command('serve')
+@click.option('--host', default='127.0.0.1', envvar='TODOS_HOST', show_default=True)
+@click.option('--port', default=8080, envvar='TODOS_PORT', show_default=True)
+@click.option('--workers', default=1, envvar='TODOS_WORKERS', show_default=True,
+              help='Worker processes; more than one needs TODOS_SHARED=1.')
+@click.option('--threads', default=8, envvar='TODOS_THREADS', show_default=True,
+              help='Request threads per worker.')
+@click.option('--keep-alive', 'keepalive', default=5, envvar='TODOS_KEEPALIVE', show_default=True,
+              help='Seconds to hold an idle keep-alive connection open.')
+@click.option('--preload/--no-preload', default=True, envvar='TODOS_PRELOAD', show_default=True,
+              help='Load the todos once in the master and fork warm workers.')
+@click.option('--timeout', default=30, show_default=True,
+              help='Seconds before a silent worker is restarted.')
+@click.option('--graceful-timeout', default=30, show_default=True,
+              help='Seconds a worker gets to drain and flush on SIGTERM.')
+@click.option('--max-streams', type=int, envvar='TODOS_MAX_STREAMS',
+              help='Open change streams per worker, each holding a thread; '
+                   'more get a 503 and poll. Defaults to half of --threads.')
+def serve(host, port, workers, threads, keepalive, preload, timeout, graceful_timeout, max_streams):
+    """Run the app under gunicorn"""
+    if workers > 1 and not SHARED:
+        raise click.UsageError('Several workers would each keep their own copy of the todos; '
+                               'set TODOS_SHARED=1 to run more than one')
+    # Leave threads for everything else, however many tabs are open
+    limit_streams(threads // 2 if max_streams is None else max_streams)
+    try:
+        import serve as server
+    except ImportError as e:
+        raise click.ClickException(f'{e}; install gunicorn to use this command') from None
+    server.run(host, port, workers, threads, keepalive, preload, timeout, graceful_timeout)
+
+def _shut_down(signum, frame):
+    """Flush the store on SIGTERM, which skips atexit handlers"""
+    drain()
+    store.close()
+    sys.exit(0)
+
+if __name__ == '__main__':
+    print("Starting Todo App...")
+    print("Visit: http://127.0.0.1:8080")
+    signal.signal(signal.SIGTERM, _shut_down)
+    # The reloader's parent process SIGKILLs the server on SIGTERM, before
+    # the store can flush, so serve from this process
+    app.run(debug=True, host='127.0.0.1', port=8080, use_reloader=False)
@@ -0,0 +1,223 @@
+"""ASGI entry point for the todo app.
+
+Run with any ASGI server, e.g. ``uvicorn asgi:app``. The Flask app in
+app.py stays the single definition of every route: each request runs it on
+a bounded thread pool, so storage I/O never blocks the event loop, while
+idle keep-alive connections cost no thread at all. /api/todos/stream is
+served natively on the event loop, so open change streams hold no thread
+either.
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import partial
+from urllib.parse import parse_qs
+
+from app import STREAM_KEEPALIVE, _format_changes, app as flask_app, store
+
+# Requests handled at once; further requests wait on the event loop
+ASGI_THREADS = int(os.environ.get('TODOS_ASGI_THREADS', '32'))
+
+# Response chunks buffered between a worker thread and the event loop
+RESPONSE_BUFFER = 16
+
+# Seconds a worker thread waits on a full buffer before checking whether
+# the response was abandoned
+PUT_TIMEOUT = 1.0
+
+
+class _Abandoned(Exception):
+    """The event loop stopped reading a response (client gone or task cancelled)"""
+
+
+class TodoASGI:
+    """Serve a WSGI app over ASGI, plus a native change stream"""
+
+    def __init__(self, wsgi_app, max_workers=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='todo-asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+        elif scope['method'] == 'GET' and scope['path'] == '/api/todos/stream':
+            await self._stream(scope, receive, send)
+        else:
+            await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Write out anything still pending before the process exits
+                await asyncio.get_running_loop().run_in_executor(self.executor, store.close)
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _wsgi(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(RESPONSE_BUFFER)
+        abandoned = threading.Event()
+        worker = loop.run_in_executor(self.executor, self._run_wsgi, scope, bytes(body), loop, queue,
+                                      abandoned)
+
+        try:
+            started = False
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if not started:
+                    status, headers = item
+                    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                    started = True
+                else:
+                    await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+        finally:
+            # If send() failed or we were cancelled, the worker stops at its
+            # next chunk and closes the response; either way the thread is
+            # back in the pool before we return
+            abandoned.set()
+            await worker
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    def _run_wsgi(self, scope, body, loop, queue, abandoned):
+        """Run the WSGI app on a worker thread, feeding ``queue``.
+
+        Gives up, closing the response, once ``abandoned`` is set.
+        """
+        def put(item):
+            if abandoned.is_set():
+                raise _Abandoned
+            # Blocks this thread, not the loop, while the client catches up
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(PUT_TIMEOUT)
+                except FutureTimeout:
+                    if abandoned.is_set():
+                        future.cancel()
+                        raise _Abandoned from None
+
+        response_start = []
+
+        def start_response(status, headers, exc_info=None):
+            response_start[:] = [(int(status.split(' ', 1)[0]),
+                                  [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers])]
+
+        try:
+            try:
+                result = self.wsgi_app(_environ(scope, body), start_response)
+                try:
+                    started = False
+                    for chunk in result:
+                        if not started:
+                            put(response_start[0])
+                            started = True
+                        if chunk:
+                            put(chunk)
+                    if not started:
+                        put(response_start[0])
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            finally:
+                put(None)
+        except _Abandoned:
+            pass
+
+    async def _stream(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        loop = asyncio.get_running_loop()
+        version = (headers.get(b'last-event-id', b'').decode('latin-1') or query.get('since', [''])[0]
+                   or await loop.run_in_executor(self.executor, store.current_version))
+        wakeup = asyncio.Event()
+
+        def poke():
+            loop.call_soon_threadsafe(wakeup.set)
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        store.subscribe(poke)
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+            while not disconnected.done():
+                # Cheap in memory, but may reload from disk in shared mode
+                changes = await loop.run_in_executor(self.executor,
+                                                     partial(store.changes_since, version, todos=False))
+                version = changes['version']
+                events = _format_changes(changes)
+                if events:
+                    await send({'type': 'http.response.body', 'body': events.encode(), 'more_body': True})
+
+                woken = asyncio.ensure_future(wakeup.wait())
+                done, _ = await asyncio.wait({woken, disconnected}, timeout=STREAM_KEEPALIVE,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                wakeup.clear()
+        finally:
+            store.unsubscribe(poke)
+            disconnected.cancel()
+
+
+def _environ(scope, body):
+    """Build a WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    # The body has been read in full, chunked or not
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+app = TodoASGI(flask_app)
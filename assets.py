@@ -0,0 +1,89 @@
+"""Content-hashed, precompressed static assets for the frontend.
+
+Everything is read, hashed and compressed once at startup. Hashed URLs
+(``app.<hash>.js``) never change content, so they are served with a
+one-year immutable Cache-Control; other names (the page itself) are served
+with ``no-cache`` and an ETag, so a repeat visit costs a 304.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Asset:
+    """One file's bytes in every encoding worth sending"""
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+
+class AssetBundle:
+    """Serves the files of ``directory`` under content-hashed names"""
+
+    # Preferred order when the client accepts several encodings
+    ENCODINGS = ('br', 'gzip')
+
+    def __init__(self, directory):
+        self._assets = {}
+        self._urls = {}
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), 'rb') as f:
+                body = f.read()
+            self.add(name, body)
+
+    def add(self, name, body, hashed=True):
+        """Register ``body`` under ``name``, and a hashed alias if ``hashed``"""
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        asset = Asset(body, content_type)
+        self._assets[name] = asset, False
+        self._urls[name] = '/static/' + name
+        if hashed:
+            stem, ext = os.path.splitext(name)
+            hashed_name = f'{stem}.{asset.digest[:12]}{ext}'
+            self._assets[hashed_name] = asset, True
+            self._urls[name] = '/static/' + hashed_name
+
+    def url(self, name):
+        return self._urls[name]
+
+    def send(self, name):
+        """Respond with asset ``name`` in the best encoding the client takes"""
+        if name not in self._assets:
+            abort(404)
+        asset, immutable = self._assets[name]
+
+        encoding = next((e for e in self.ENCODINGS
+                         if e in asset.variants and request.accept_encodings[e]), 'identity')
+        # Each encoding is a different byte sequence, so it gets its own tag
+        etag = asset.digest if encoding == 'identity' else f'{asset.digest}-{encoding}'
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(asset.variants[encoding], content_type=asset.content_type)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE if immutable else 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
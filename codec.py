@@ -0,0 +1,88 @@
+"""JSON encoding for storage and API responses.
+
+``dumps()`` and ``loads()`` use orjson when it is installed, then msgspec,
+and fall back to the stdlib json module. All three produce compact UTF-8
+bytes unless ``pretty`` is asked for, and all raise one of
+``DecodeError`` on malformed input. Objects with a ``to_dict()`` method
+(models.Todo) are encoded as the dict it returns. ``JSONProvider`` plugs
+the codec into Flask, so jsonify() and request.get_json() go through it
+too.
+"""
+import json
+
+from flask.json.provider import JSONProvider as _FlaskJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(obj):
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is None:
+        raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+    return to_dict()
+
+
+if orjson is not None:
+    NAME = 'orjson'
+    DecodeError = (orjson.JSONDecodeError,)
+
+    def dumps(obj, pretty=False, sort_keys=False):
+        option = (orjson.OPT_INDENT_2 if pretty else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(data):
+        return orjson.loads(data)
+
+elif msgspec is not None:
+    NAME = 'msgspec'
+    DecodeError = (msgspec.DecodeError,)
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _sorted_encoder = msgspec.json.Encoder(enc_hook=_default, order='sorted')
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj, pretty=False, sort_keys=False):
+        data = (_sorted_encoder if sort_keys else _encoder).encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def loads(data):
+        return _decoder.decode(data)
+
+else:
+    NAME = 'json'
+    DecodeError = (json.JSONDecodeError, UnicodeDecodeError)
+
+    def dumps(obj, pretty=False, sort_keys=False):
+        if pretty:
+            return json.dumps(obj, indent=2, sort_keys=sort_keys, ensure_ascii=False,
+                              default=_default).encode()
+        return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False,
+                          default=_default).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+class JSONProvider(_FlaskJSONProvider):
+    """Flask JSON provider backed by this module"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', False)).decode()
+
+    def loads(self, s, **kwargs):
+        try:
+            return loads(s)
+        except DecodeError as e:
+            # Flask turns a ValueError into 400 Bad Request
+            raise ValueError(str(e)) from e
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype='application/json')
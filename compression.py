@@ -0,0 +1,131 @@
+"""Negotiated compression for JSON API responses.
+
+Responses under ``/api/`` that are at least ``min_size`` bytes, or are
+streamed and so have no known size, are compressed with the best of zstd,
+brotli and gzip that the client accepts. zstd and brotli are used only
+when the ``zstandard`` and ``brotli`` modules are installed. Streamed
+bodies are compressed chunk by chunk as they are sent, never buffered
+whole. ``stats`` counts responses and bytes per encoding for /metrics.
+"""
+import threading
+import zlib
+from collections import Counter
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _BrotliCompressor:
+    """Give brotli.Compressor the compress/flush interface of zlib's"""
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class ResponseCompressor:
+    """after_request hook compressing API responses"""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4, zstd_level=3, prefix='/api/'):
+        self.min_size = min_size
+        self.prefix = prefix
+        # Server preference, used to break ties in the client's qualities
+        self.factories = {}
+        if zstandard is not None:
+            self.factories['zstd'] = lambda: zstandard.ZstdCompressor(level=zstd_level).compressobj()
+        if brotli is not None:
+            self.factories['br'] = lambda: _BrotliCompressor(brotli_quality)
+        self.factories['gzip'] = lambda: zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def choose(self, accept_encodings):
+        """Pick the encoding to use, or 'identity'"""
+        best, best_quality = 'identity', 0
+        for encoding in self.factories:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, response):
+        if not request.path.startswith(self.prefix) or not self._compressible(response):
+            return response
+
+        encoding = self.choose(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding == 'identity':
+            self._count(encoding, response.content_length or 0, response.content_length or 0)
+            return response
+
+        compressor = self.factories[encoding]()
+        if response.is_streamed:
+            response.response = self._stream(response.response, compressor, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            data = compressor.compress(body) + compressor.flush()
+            response.set_data(data)
+            self._count(encoding, len(body), len(data))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compressible(self, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206):
+            return False
+        if response.status_code >= 300 or 'Content-Encoding' in response.headers:
+            return False
+        if response.mimetype != 'application/json':
+            return False
+        # A strong ETag promises these exact bytes (If-Match relies on it)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            return False
+        return response.is_streamed or (response.content_length or 0) >= self.min_size
+
+    def _stream(self, chunks, compressor, encoding):
+        size_in = size_out = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                size_in += len(chunk)
+                data = compressor.compress(chunk)
+                if data:
+                    size_out += len(data)
+                    yield data
+            data = compressor.flush()
+            size_out += len(data)
+            yield data
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self._count(encoding, size_in, size_out)
+
+    def snapshot(self):
+        """A consistent copy of ``stats``"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _count(self, encoding, size_in, size_out):
+        with self._stats_lock:
+            self.stats['responses', encoding] += 1
+            self.stats['bytes_in', encoding] += size_in
+            self.stats['bytes_out', encoding] += size_out
@@ -0,0 +1,81 @@
+"""The todo record kept in memory.
+
+A ``Todo`` has ``__slots__`` instead of a per-instance dict, interns its
+text (lists full of "Buy milk" share one string) and holds ``created_at``
+as an int: microseconds since 1970-01-01 on the local wall clock, which
+is what ``datetime.now()`` reports. ``to_dict()`` gives back the JSON
+shape the API and the files have always used, ISO timestamp included.
+"""
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def parse_timestamp(value):
+    """ISO 8601 string -> wall-clock microseconds since the epoch"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return _micros(moment)
+
+
+def format_timestamp(micros):
+    """Wall-clock microseconds since the epoch -> ISO 8601 string"""
+    seconds, fraction = divmod(micros, 1000000)
+    # Same layout as datetime.isoformat(), which omits a zero fraction
+    return f'{_format_seconds(seconds)}.{fraction:06d}' if fraction else _format_seconds(seconds)
+
+
+class Todo:
+    """One todo; treat it as immutable and use ``replace()`` to change it"""
+
+    __slots__ = ('id', 'text', 'completed', 'created_at')
+
+    def __init__(self, id, text, completed, created_at):
+        self.id = id
+        self.text = sys.intern(text)
+        self.completed = bool(completed)
+        self.created_at = created_at
+
+    @classmethod
+    def new(cls, id, text):
+        return cls(id, text, False, _micros(datetime.now()))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['text'], data['completed'], parse_timestamp(data['created_at']))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'completed': self.completed,
+            'created_at': format_timestamp(self.created_at),
+        }
+
+    def replace(self, **changes):
+        """Return a copy with the given fields changed"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return Todo(**fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, Todo):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'Todo(%r, %r, %r, %r)' % (self.id, self.text, self.completed, self.created_at)
+
+
+# Todos tend to be created in bursts, so whole seconds repeat a lot
+@lru_cache(maxsize=4096)
+def _format_seconds(seconds):
+    return (_EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+def _micros(moment):
+    return (moment - _EPOCH) // _MICROSECOND
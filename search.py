@@ -0,0 +1,138 @@
+"""Inverted index for searching todo text.
+
+Text is split into words (``\\w+``) and case-folded. Every word maps to the
+set of todo ids containing it, and a sorted list of all known words lets a
+query word match every indexed word it is a prefix of, so "gro" finds
+"groceries". The index is updated one todo at a time as todos change.
+"""
+import math
+import re
+from bisect import bisect_left, insort
+from heapq import nlargest
+from itertools import groupby, islice
+
+_WORD = re.compile(r'\w+')
+
+
+class QueryTooBroad(ValueError):
+    """A query word is the prefix of too many indexed words to search for"""
+
+
+def tokenize(text):
+    """The distinct case-folded words of ``text``"""
+    return set(_WORD.findall(text.casefold()))
+
+
+class SearchIndex:
+    """Word -> todo ids, with prefix lookups and ranked AND queries"""
+
+    # A prefix counts for this much of a whole-word match
+    PREFIX_WEIGHT = 0.5
+
+    # Words one query word may expand to; a query word that is the prefix
+    # of more is rejected rather than searched for incompletely
+    MAX_EXPANSIONS = 1000
+
+    def __init__(self, todos=()):
+        self._postings = {}
+        self._words = []
+        self._size = 0
+        for todo in todos:
+            self.add(todo)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, todo):
+        for word in tokenize(todo.text):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                insort(self._words, word)
+            ids.add(todo.id)
+        self._size += 1
+
+    def remove(self, todo):
+        for word in tokenize(todo.text):
+            ids = self._postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(todo.id)
+            if not ids:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+        self._size -= 1
+
+    def search(self, query, limit=20, accept=None):
+        """Ids of the best ``limit`` todos matching every word of ``query``.
+
+        A query word scores the idf of the rarest indexed word it matches
+        in a todo, discounted by PREFIX_WEIGHT for a prefix match; ties go
+        to the newest todo. ``accept``, if given, filters ids. Candidates
+        are found with set operations, and per-todo scoring is only done
+        when prefixes of several query words give scores a chance to differ.
+        Raises QueryTooBroad if a query word matches over MAX_EXPANSIONS words.
+        """
+        # Per query word: (weight, ids) of the words it matches, best first
+        tiers = []
+        for term in tokenize(query):
+            words = self._expand(term)
+            if not words:
+                return []
+            tiers.append(sorted(((self._weight(word, term), self._postings[word]) for word in words),
+                                key=lambda tier: tier[0], reverse=True))
+        if not tiers:
+            return []
+
+        if len(tiers) == 1:
+            # Walk the tiers best first; within a tier every todo scores the same
+            results, seen = [], set()
+            for _, group in groupby(tiers[0], key=lambda tier: tier[0]):
+                ids = set().union(*(ids for _, ids in group)) - seen
+                results += _top(ids, limit - len(results), accept)
+                if len(results) >= limit:
+                    break
+                seen |= ids
+            return results
+
+        matched = sorted((set().union(*(ids for _, ids in t)) if len(t) > 1 else t[0][1] for t in tiers),
+                         key=len)
+        candidates = matched[0].intersection(*matched[1:])
+        if all(len(t) == 1 for t in tiers):
+            return _top(candidates, limit, accept)
+        # Each query word's best weight per candidate, better tiers written last
+        weights = []
+        for t in tiers:
+            best = {}
+            for weight, ids in reversed(t):
+                best.update(dict.fromkeys(candidates.intersection(ids), weight))
+            weights.append(best)
+        candidates = list(candidates)
+        scored = zip(map(sum, zip(*(map(best.__getitem__, candidates) for best in weights))), candidates)
+        if accept is None:
+            return [todo_id for _, todo_id in nlargest(limit, scored)]
+        ranked = (todo_id for _, todo_id in sorted(scored, reverse=True))
+        return list(islice(filter(accept, ranked), limit))
+
+    def _weight(self, word, term):
+        weight = math.log(1 + self._size / len(self._postings[word]))
+        return weight if word == term else weight * self.PREFIX_WEIGHT
+
+    def _expand(self, term):
+        """Indexed words starting with ``term``, the word itself first"""
+        start = bisect_left(self._words, term)
+        end = start
+        while end < len(self._words) and self._words[end].startswith(term):
+            if end - start == self.MAX_EXPANSIONS:
+                raise QueryTooBroad(f'"{term}" matches too many words; type more of it')
+            end += 1
+        return self._words[start:end]
+
+
+def _top(ids, limit, accept=None):
+    """The ``limit`` largest (newest) ids that ``accept`` lets through"""
+    if limit <= 0:
+        return []
+    if accept is None:
+        return nlargest(limit, ids)
+    return list(islice(filter(accept, sorted(ids, reverse=True)), limit))
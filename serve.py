@@ -0,0 +1,77 @@
+"""Production server for the todo app, run by ``flask --app app serve``.
+
+The app (and with it the todo store) is imported once in the gunicorn
+master, so with ``preload`` the workers start from a warm copy of the
+store; a worker forked later to replace one reloads it instead. Workers
+chain gunicorn's SIGTERM handler to flip /readyz to 503 and end open
+change streams while they drain in-flight requests, and flush the store
+on the way out.
+"""
+import signal
+
+from gunicorn.app.base import BaseApplication
+
+import app as todo_app
+
+
+class TodoServer(BaseApplication):
+    """Run a WSGI app in-process under gunicorn with the given settings"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def run(host, port, workers, threads, keepalive, preload, timeout, graceful_timeout):
+    # Workers forked so far, counted in the master and inherited by each child
+    spawned = 0
+
+    def pre_fork(server, worker):
+        nonlocal spawned
+        spawned += 1
+
+    def post_fork(server, worker):
+        # The first preloaded workers keep the master's todos. A worker that
+        # replaces one (after a timeout, crash or max-requests) reads them
+        # afresh, since its predecessor may have written since startup
+        todo_app.store.after_fork(reload=not preload or spawned > workers)
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        # Threaded workers keep idle keep-alive connections from pinning a process
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'keepalive': keepalive,
+        'preload_app': preload,
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _worker_exit,
+    }
+    TodoServer(todo_app.app, options).run()
+
+
+def _post_worker_init(worker):
+    # Runs after gunicorn has installed its own signal handlers
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        todo_app.drain()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def _worker_exit(server, worker):
+    todo_app.store.close()
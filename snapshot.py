@@ -0,0 +1,161 @@
+"""Compact binary snapshot format for the todo list.
+
+A snapshot is a 32-byte header followed by one column per field, each
+column starting on an 8-byte boundary::
+
+    header      magic b'TODOSNAP', version u16, flags u16, crc32 u32,
+                count u64, next_id u64
+    ids         int64[count], ascending
+    completed   uint8[count]
+    text        uint64[count + 1] end offsets, then the UTF-8 bytes
+    created_at  uint64[count + 1] end offsets, then the ISO timestamps as UTF-8
+
+All integers are little-endian and the crc32 covers everything after the
+header. The numeric columns are fixed-width arrays, so a memory-mapped
+file can be read in place, without parsing; ``SnapshotView`` does that.
+"""
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from itertools import accumulate
+
+from models import Todo, format_timestamp, parse_timestamp
+
+MAGIC = b'TODOSNAP'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHHIQQ')
+
+
+def is_snapshot(path):
+    """Whether ``path`` holds a binary snapshot rather than JSON"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def dump(todos, next_id, f):
+    """Write ``todos`` and the next free id to binary file ``f``"""
+    todos = sorted(todos, key=lambda t: t.id)
+    texts = [t.text.encode() for t in todos]
+    stamps = [format_timestamp(t.created_at).encode() for t in todos]
+    columns = [
+        _array('q', [t.id for t in todos]),
+        bytes(t.completed for t in todos),
+        _array('Q', accumulate(map(len, texts), initial=0)), b''.join(texts),
+        _array('Q', accumulate(map(len, stamps), initial=0)), b''.join(stamps),
+    ]
+    body = bytearray()
+    for i, column in enumerate(columns):
+        body += column
+        # Blobs follow their offsets directly; arrays start aligned
+        if i not in (2, 4):
+            body += bytes(-len(body) % 8)
+    f.write(_HEADER.pack(MAGIC, VERSION, 0, zlib.crc32(body), len(todos), next_id))
+    f.write(body)
+
+
+def load(path):
+    """Read a binary snapshot into ``(todos, next_id)``"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    _, next_id, (ids, completed, text_ends, text, stamp_ends, stamps) = read_columns(memoryview(data))
+    text, stamps = bytes(text), bytes(stamps)
+    text_ends, stamp_ends = text_ends.tolist(), stamp_ends.tolist()
+    todos = [
+        Todo(todo_id, text[a:b].decode(), done, parse_timestamp(stamps[c:d].decode()))
+        for todo_id, done, a, b, c, d in zip(ids.tolist(), completed, text_ends,
+                                             text_ends[1:], stamp_ends, stamp_ends[1:])
+    ]
+    return todos, next_id
+
+
+class SnapshotView(Mapping):
+    """Read-only id -> todo mapping over a memory-mapped snapshot.
+
+    Only the pages a lookup touches are read: ``ids`` and ``completed``
+    are the raw columns, and a Todo is decoded from its offsets each time
+    it is looked up, never cached.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, self.next_id, columns = read_columns(memoryview(self._mmap))
+        self.ids, self.completed, self._text_ends, self._text, self._stamp_ends, self._stamps = columns
+
+    def __getitem__(self, todo_id):
+        i = self._position(todo_id)
+        if i is None:
+            raise KeyError(todo_id)
+        return Todo(
+            todo_id,
+            str(self._text[self._text_ends[i]:self._text_ends[i + 1]], 'utf-8'),
+            self.completed[i],
+            parse_timestamp(str(self._stamps[self._stamp_ends[i]:self._stamp_ends[i + 1]], 'utf-8')),
+        )
+
+    def __contains__(self, todo_id):
+        return self._position(todo_id) is not None
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _position(self, todo_id):
+        i = bisect_left(self.ids, todo_id)
+        return i if i < len(self.ids) and self.ids[i] == todo_id else None
+
+
+def read_columns(view):
+    """Validate a snapshot in ``view`` and slice it into its columns.
+
+    Returns ``(count, next_id, columns)``; the columns are memoryviews into
+    ``view`` (or copies on big-endian machines), in the order listed in
+    the module docstring.
+    """
+    if len(view) < _HEADER.size:
+        raise ValueError('Truncated todo snapshot')
+    magic, version, _, crc, count, next_id = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError('Not a todo snapshot')
+    if version != VERSION:
+        raise ValueError(f'Unsupported todo snapshot version {version}')
+    if zlib.crc32(view[_HEADER.size:]) != crc:
+        raise ValueError('Corrupt todo snapshot (checksum mismatch)')
+
+    offset = _HEADER.size
+    ids, offset = _column(view, offset, 'q', count)
+    completed, offset = _column(view, offset, 'B', count)
+    text_ends, offset = _column(view, offset, 'Q', count + 1, align=False)
+    text, offset = view[offset:offset + text_ends[-1]], offset + text_ends[-1]
+    offset += -offset % 8
+    stamp_ends, offset = _column(view, offset, 'Q', count + 1, align=False)
+    stamps = view[offset:offset + stamp_ends[-1]]
+    return count, next_id, [ids, completed, text_ends, text, stamp_ends, stamps]
+
+
+def _array(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _column(view, offset, typecode, count, align=True):
+    end = offset + count * array(typecode).itemsize
+    if end > len(view):
+        raise ValueError('Truncated todo snapshot')
+    column = view[offset:end].cast(typecode)
+    if sys.byteorder == 'big' and typecode != 'B':
+        column = array(typecode, column)
+        column.byteswap()
+    return column, end + (-end % 8 if align else 0)
@@ -0,0 +1,686 @@
+// Global variables
+let todos = [];
+let currentFilter = 'all';
+let editingId = null;
+
+// Pagination state
+const PAGE_SIZE = 100;
+let nextCursor = null;
+let hasMore = true;
+let loadingMore = false;
+let loadGeneration = 0;
+
+// Version of the todos we hold; /api/todos/changes reports what
+// happened after it. Browsers without EventSource poll for changes, as
+// do pages the server turns away from /api/todos/stream
+const SYNC_INTERVAL = 10000;
+let syncVersion = null;
+let changeStream = null;
+let polling = false;
+let statsTimer = null;
+
+// Counts from /api/todos/stats, kept in step with local changes
+let stats = { total: 0, active: 0, completed: 0 };
+
+// Rendered rows by todo id, and the todo each row currently shows.
+// todos only ever holds todos matching currentFilter, in id order
+const rows = new Map();
+const renderedTodos = new Map();
+
+// Only the rows in view, plus OVERSCAN either side, are in the DOM;
+// padding on the list stands in for the rest. Every row is rowHeight
+// tall, measured from a mounted row (0 until then)
+const OVERSCAN = 10;
+const ESTIMATED_ROW_HEIGHT = 56;
+let rowHeight = 0;
+let renderPending = false;
+
+// Toggles and deletes show up at once and are sent a moment later, all
+// together, in one POST /api/todos/batch. Until then each changed todo
+// is queued by id with the todo as the server has it (original) and as
+// it should end up (todo, null when deleted)
+const FLUSH_DELAY = 150;
+const pendingChanges = new Map();
+let flushTimer = null;
+let flushing = null;
+
+// Requests under way that show the loading indicator
+let loadingCount = 0;
+
+// DOM elements
+const todoInput = document.getElementById('todoInput');
+const todoList = document.getElementById('todoList');
+const todoCount = document.getElementById('todoCount');
+const addBtn = document.getElementById('addBtn');
+const clearCompletedBtn = document.getElementById('clearCompleted');
+const loadingDiv = document.getElementById('loading');
+const errorDiv = document.getElementById('errorMessage');
+const loadMoreSentinel = document.getElementById('loadMoreSentinel');
+
+// Markup for one row; new rows are cloned from it and filled in
+const rowTemplate = document.createElement('template');
+rowTemplate.innerHTML = `
+    <li class="todo-item">
+        <div class="todo-checkbox"></div>
+        <div class="todo-text"></div>
+        <div class="todo-actions">
+            <button class="todo-btn delete-btn">Delete</button>
+        </div>
+    </li>
+`.trim();
+
+// Initialize app
+document.addEventListener('DOMContentLoaded', function() {
+    loadTodos();
+    setupEventListeners();
+    setupInfiniteScroll();
+    if (!window.EventSource) startPolling();
+});
+
+// Event listeners
+function setupEventListeners() {
+    // Add todo on Enter key press
+    todoInput.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter') {
+            addTodo();
+        }
+    });
+
+    // Enable/disable add button based on input
+    todoInput.addEventListener('input', function() {
+        addBtn.disabled = !todoInput.value.trim();
+    });
+
+    // One listener for every row's checkbox and delete button
+    todoList.addEventListener('click', function(e) {
+        const row = e.target.closest('.todo-item');
+        if (!row) return;
+
+        const id = Number(row.dataset.id);
+        if (e.target.closest('.todo-checkbox')) {
+            toggleTodo(id);
+        } else if (e.target.closest('.delete-btn')) {
+            deleteTodo(id);
+        }
+    });
+
+    // Move the window of mounted rows along with the page
+    window.addEventListener('scroll', scheduleRender, { passive: true });
+    window.addEventListener('resize', function() {
+        rowHeight = 0;
+        scheduleRender();
+    });
+
+    // Send queued changes before the page goes away
+    window.addEventListener('pagehide', () => flushChanges({ keepalive: true }));
+}
+
+// Sync every SYNC_INTERVAL, and as soon as the tab is looked at again
+function startPolling() {
+    if (polling) return;
+    polling = true;
+    setInterval(syncTodos, SYNC_INTERVAL);
+    document.addEventListener('visibilitychange', syncTodos);
+}
+
+// Fetch the next page whenever the end of the list comes into view
+function setupInfiniteScroll() {
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreTodos();
+        }
+    }, { rootMargin: '200px' });
+    observer.observe(loadMoreSentinel);
+}
+
+// API functions
+async function apiCall(url, options = {}) {
+    try {
+        // Only list loads show the indicator; everything else is quiet
+        if (options.loading && loadingCount++ === 0) showLoading(true);
+        const response = await fetch(url, {
+            headers: {
+                'Content-Type': 'application/json',
+                ...options.headers
+            },
+            ...options
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || 'Something went wrong');
+        }
+
+        const data = await response.json();
+        if (options.withCursor) {
+            return {
+                data,
+                nextCursor: response.headers.get('X-Next-Cursor'),
+                version: (response.headers.get('ETag') || '').replace('W/', '').replace(/"/g, '')
+            };
+        }
+        return data;
+    } catch (error) {
+        showError(error.message);
+        throw error;
+    } finally {
+        if (options.loading && --loadingCount === 0) showLoading(false);
+    }
+}
+
+// Load the counts and the first page of todos for the current filter
+async function loadTodos() {
+    todos = [];
+    nextCursor = null;
+    hasMore = true;
+    loadingMore = false;
+    loadGeneration++;
+
+    await Promise.all([loadStats(), loadMoreTodos()]);
+}
+
+async function loadStats() {
+    try {
+        stats = await apiCall('/api/todos/stats');
+        updateStats();
+    } catch (error) {
+        console.error('Failed to load stats:', error);
+    }
+}
+
+// Append the next page of todos
+async function loadMoreTodos() {
+    if (loadingMore || !hasMore) return;
+    loadingMore = true;
+    let loaded = false;
+    const generation = loadGeneration;
+
+    try {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (nextCursor !== null) params.set('cursor', nextCursor);
+        if (currentFilter !== 'all') params.set('status', currentFilter);
+
+        const page = await apiCall(`/api/todos?${params}`, { withCursor: true, loading: nextCursor === null });
+
+        // The filter changed while this page was in flight
+        if (generation !== loadGeneration) return;
+
+        // Later pages may be newer, but syncing from the first page's
+        // version replays anything they already contain harmlessly
+        if (nextCursor === null) {
+            syncVersion = page.version;
+            openChangeStream();
+        }
+
+        // Todos added while paging already sit at the end of the list,
+        // and changes not sent yet win over what the server sent
+        const known = new Set(todos.map(t => t.id));
+        const fresh = page.data
+            .filter(t => !known.has(t.id))
+            .map(t => pendingChanges.has(t.id) ? pendingChanges.get(t.id).todo : t)
+            .filter(t => t && matchesFilter(t));
+        todos = todos.concat(fresh);
+        todos.sort((a, b) => a.id - b.id);
+
+        nextCursor = page.nextCursor;
+        hasMore = nextCursor !== null;
+        loaded = true;
+        renderTodos();
+    } catch (error) {
+        console.error('Failed to load todos:', error);
+    } finally {
+        if (generation === loadGeneration) loadingMore = false;
+    }
+
+    // The observer only fires on changes, so keep going while a short
+    // page leaves the sentinel on screen
+    if (loaded && hasMore && loadMoreSentinel.getBoundingClientRect().top < window.innerHeight + 200) {
+        loadMoreTodos();
+    }
+}
+
+// Fetch only what changed since syncVersion and merge it in
+async function syncTodos() {
+    if (syncVersion === null || document.hidden) return;
+
+    try {
+        const params = new URLSearchParams({ since: syncVersion });
+        const changes = await apiCall(`/api/todos/changes?${params}`);
+
+        if (changes.snapshot) {
+            // Too far behind for the change journal
+            await loadTodos();
+            return;
+        }
+
+        applyChanges(changes);
+        syncVersion = changes.version;
+    } catch (error) {
+        console.error('Failed to sync todos:', error);
+    }
+}
+
+// Apply pushed changes as they happen; EventSource reconnects on its own
+// and resumes from the last event id it saw
+function openChangeStream() {
+    if (changeStream || polling || !window.EventSource) return;
+
+    const params = new URLSearchParams({ since: syncVersion });
+    changeStream = new EventSource(`/api/todos/stream?${params}`);
+
+    // Keep syncVersion current in case we have to poll later
+    const empty = { created: [], updated: [], deleted: [] };
+    const track = e => {
+        if (e.lastEventId) syncVersion = e.lastEventId;
+    };
+    changeStream.addEventListener('created', e => {
+        applyChanges({ ...empty, created: [JSON.parse(e.data)] });
+        track(e);
+    });
+    changeStream.addEventListener('updated', e => {
+        applyChanges({ ...empty, updated: [JSON.parse(e.data)] });
+        track(e);
+    });
+    changeStream.addEventListener('deleted', e => {
+        applyChanges({ ...empty, deleted: [JSON.parse(e.data).id] });
+        track(e);
+    });
+    changeStream.addEventListener('reset', () => loadTodos());
+
+    // A refused stream (503 when the server has no room for more) is not
+    // retried by EventSource; poll instead
+    changeStream.addEventListener('error', () => {
+        if (changeStream.readyState === EventSource.CLOSED) {
+            changeStream = null;
+            startPolling();
+        }
+    });
+}
+
+function applyChanges(changes) {
+    const deleted = new Set(changes.deleted);
+    const changed = new Map(changes.created.concat(changes.updated).map(t => [t.id, t]));
+    if (deleted.size === 0 && changed.size === 0) return;
+
+    // Queued changes now apply to what the server has, and still win
+    for (const [id, change] of pendingChanges) {
+        if (deleted.has(id)) {
+            pendingChanges.delete(id);
+        } else if (changed.has(id)) {
+            change.original = changed.get(id);
+            changed.delete(id);
+            if (sameState(change.original, change.todo)) pendingChanges.delete(id);
+        }
+    }
+
+    // Drop deleted todos and stale copies, then merge in the new versions
+    todos = todos.filter(t => !deleted.has(t.id) && !changed.has(t.id));
+    for (const todo of changed.values()) {
+        if (matchesFilter(todo)) todos.push(todo);
+    }
+    todos.sort((a, b) => a.id - b.id);
+
+    renderTodos();
+
+    // One stats request per burst of changes
+    clearTimeout(statsTimer);
+    statsTimer = setTimeout(loadStats, 250);
+}
+
+// Add new todo
+async function addTodo() {
+    const text = todoInput.value.trim();
+    if (!text) return;
+
+    try {
+        const newTodo = await apiCall('/api/todos', {
+            method: 'POST',
+            body: JSON.stringify({ text })
+        });
+
+        // The change stream may have delivered it already; the counts
+        // only move if it had not
+        applyLocally(findTodo(newTodo.id), newTodo);
+        todoInput.value = '';
+        addBtn.disabled = true;
+        renderTodos();
+        updateStats();
+        hideError();
+    } catch (error) {
+        console.error('Failed to add todo:', error);
+    }
+}
+
+// Toggle todo completion
+function toggleTodo(id) {
+    const todo = findTodo(id);
+    if (todo) queueChange(todo, { ...todo, completed: !todo.completed });
+}
+
+// Delete todo
+function deleteTodo(id) {
+    const todo = findTodo(id);
+    if (todo) queueChange(todo, null);
+}
+
+// Show a change now and queue it for the next batch
+function queueChange(before, after) {
+    const id = before.id;
+    const original = pendingChanges.has(id) ? pendingChanges.get(id).original : before;
+
+    // Toggling twice before the batch goes out cancels out
+    if (sameState(original, after)) {
+        pendingChanges.delete(id);
+    } else {
+        pendingChanges.set(id, { original, todo: after });
+    }
+
+    applyLocally(before, after);
+    renderTodos();
+    updateStats();
+
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushChanges, FLUSH_DELAY);
+}
+
+// Send every queued change in one batch, once any batch in flight is done
+async function flushChanges(options = {}) {
+    clearTimeout(flushTimer);
+    while (flushing) await flushing;
+    if (pendingChanges.size === 0) return;
+
+    const batch = [...pendingChanges.values()];
+    pendingChanges.clear();
+    flushing = sendBatch(batch, options);
+    try {
+        await flushing;
+    } finally {
+        flushing = null;
+    }
+}
+
+async function sendBatch(batch, options) {
+    const operations = batch.map(({ original, todo }) => todo
+        ? { op: 'update', id: todo.id, completed: todo.completed }
+        : { op: 'delete', id: original.id });
+
+    let results;
+    try {
+        ({ results } = await apiCall('/api/todos/batch', {
+            method: 'POST',
+            body: JSON.stringify(operations),
+            ...options
+        }));
+    } catch (error) {
+        // The batch is all-or-nothing, so put every todo back
+        console.error('Failed to save changes:', error);
+        batch.forEach(change => settleChange(change, change.original));
+        renderTodos();
+        updateStats();
+        return;
+    }
+
+    batch.forEach((change, i) => settleChange(change, results[i].todo || null));
+    renderTodos();
+    updateStats();
+}
+
+// The server now holds todo (null if deleted) for a sent change
+function settleChange(change, todo) {
+    const id = change.original.id;
+    const newer = pendingChanges.get(id);
+    if (newer && todo) {
+        // Changed again meanwhile; that change builds on this one
+        newer.original = todo;
+        if (sameState(todo, newer.todo)) pendingChanges.delete(id);
+    } else if (!newer && change.todo !== todo) {
+        applyLocally(change.todo, todo);
+    }
+}
+
+// Replace before with after (either may be null) in todos and the counts
+function applyLocally(before, after) {
+    if (before) countTodo(before, -1);
+    if (after) countTodo(after, 1);
+
+    const id = (before || after).id;
+    const index = todoIndex(id);
+    const present = index < todos.length && todos[index].id === id;
+    if (after && matchesFilter(after)) {
+        todos.splice(index, present ? 1 : 0, after);
+    } else if (present) {
+        todos.splice(index, 1);
+    }
+}
+
+// Whether a todo would look the same after a change (null: deleted)
+function sameState(todo, other) {
+    if (!todo || !other) return todo === other;
+    return todo.completed === other.completed && todo.text === other.text;
+}
+
+// Position of id in todos, or where it would go; todos is sorted by id
+function todoIndex(id) {
+    let low = 0;
+    let high = todos.length;
+    while (low < high) {
+        const mid = (low + high) >>> 1;
+        if (todos[mid].id < id) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return low;
+}
+
+function findTodo(id) {
+    const index = todoIndex(id);
+    return index < todos.length && todos[index].id === id ? todos[index] : null;
+}
+
+// Clear completed todos
+async function clearCompleted() {
+    if (stats.completed === 0) return;
+
+    try {
+        // The server has to know about queued toggles first
+        await flushChanges();
+
+        await apiCall('/api/todos/clear-completed', {
+            method: 'DELETE'
+        });
+
+        // Remove completed todos from local array
+        todos = todos.filter(t => !t.completed);
+        stats.total -= stats.completed;
+        stats.completed = 0;
+        renderTodos();
+        updateStats();
+    } catch (error) {
+        console.error('Failed to clear completed todos:', error);
+    }
+}
+
+// Filter todos
+function filterTodos(filter, button) {
+    currentFilter = filter;
+
+    // Update filter buttons
+    document.querySelectorAll('.filter-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    button.classList.add('active');
+
+    todos = todos.filter(matchesFilter);
+    renderTodos();
+
+    // Fetch just this subset from the server
+    loadTodos();
+}
+
+function matchesFilter(todo) {
+    switch (currentFilter) {
+        case 'active':
+            return !todo.completed;
+        case 'completed':
+            return todo.completed;
+        default:
+            return true;
+    }
+}
+
+// Render at most once per frame, however many scroll events arrive
+function scheduleRender() {
+    if (renderPending) return;
+    renderPending = true;
+    requestAnimationFrame(() => {
+        renderPending = false;
+        renderTodos();
+    });
+}
+
+// Bring the mounted rows in line with the part of todos in view,
+// touching only rows that changed
+function renderTodos() {
+    if (todos.length === 0) {
+        rows.clear();
+        renderedTodos.clear();
+        todoList.style.paddingTop = todoList.style.paddingBottom = '';
+        renderEmptyState();
+        return;
+    }
+
+    // The list's top edge stays put however much of it is padding
+    const height = rowHeight || ESTIMATED_ROW_HEIGHT;
+    const top = todoList.getBoundingClientRect().top;
+    const start = Math.min(Math.max(0, Math.floor(-top / height) - OVERSCAN), todos.length);
+    const end = Math.min(Math.max(start, Math.ceil((window.innerHeight - top) / height) + OVERSCAN), todos.length);
+    const visible = todos.slice(start, end);
+
+    // Clear out the empty state, or drop rows that scrolled away or are gone
+    if (rows.size === 0) {
+        todoList.replaceChildren();
+    } else {
+        const ids = new Set(visible.map(t => t.id));
+        for (const [id, row] of rows) {
+            if (!ids.has(id)) {
+                row.remove();
+                rows.delete(id);
+                renderedTodos.delete(id);
+            }
+        }
+    }
+
+    // What remains is in order, so only new rows need inserting
+    let next = todoList.firstElementChild;
+    for (const todo of visible) {
+        let row = rows.get(todo.id);
+        if (!row) {
+            row = createTodoElement(todo);
+            rows.set(todo.id, row);
+        } else if (renderedTodos.get(todo.id) !== todo) {
+            updateTodoElement(row, todo);
+        }
+
+        if (row === next) {
+            next = next.nextElementSibling;
+        } else {
+            todoList.insertBefore(row, next);
+        }
+    }
+
+    todoList.style.paddingTop = `${start * height}px`;
+    todoList.style.paddingBottom = `${(todos.length - end) * height}px`;
+
+    // Now that a row is mounted, measure it and place the window again;
+    // fractional heights add up over thousands of rows, so keep them
+    if (!rowHeight && todoList.firstElementChild) {
+        rowHeight = todoList.firstElementChild.getBoundingClientRect().height;
+        if (rowHeight && rowHeight !== height) scheduleRender();
+    }
+}
+
+// Create the row for a todo item
+function createTodoElement(todo) {
+    const row = rowTemplate.content.firstElementChild.cloneNode(true);
+    row.dataset.id = todo.id;
+    updateTodoElement(row, todo);
+    return row;
+}
+
+// Write whatever differs from what the row last showed
+function updateTodoElement(row, todo) {
+    const shown = renderedTodos.get(todo.id);
+    if (!shown || shown.completed !== todo.completed) {
+        row.classList.toggle('completed', todo.completed);
+        row.querySelector('.todo-checkbox').classList.toggle('checked', todo.completed);
+    }
+    if (!shown || shown.text !== todo.text) {
+        const text = row.querySelector('.todo-text');
+        text.textContent = todo.text;
+        // Rows are kept to one line, so long text is cut short
+        text.title = todo.text;
+    }
+    renderedTodos.set(todo.id, todo);
+}
+
+// Render empty state
+function renderEmptyState() {
+    const messages = {
+        all: {
+            title: "No todos yet!",
+            text: "Add your first todo above to get started."
+        },
+        active: {
+            title: "No active todos!",
+            text: "All your todos are completed. Great job! 🎉"
+        },
+        completed: {
+            title: "No completed todos!",
+            text: "Complete some todos to see them here."
+        }
+    };
+
+    const message = messages[currentFilter];
+    todoList.innerHTML = `
+        <div class="empty-state">
+            <h3>${message.title}</h3>
+            <p>${message.text}</p>
+        </div>
+    `;
+}
+
+// Update stats
+function updateStats() {
+    const activeTodos = stats.active;
+    const completedTodos = stats.completed;
+
+    todoCount.textContent = `${activeTodos} ${activeTodos === 1 ? 'item' : 'items'} left`;
+
+    // Enable/disable clear completed button
+    clearCompletedBtn.disabled = completedTodos === 0;
+}
+
+// Add (delta = 1) or remove (delta = -1) a todo from the counts
+function countTodo(todo, delta) {
+    stats.total += delta;
+    stats[todo.completed ? 'completed' : 'active'] += delta;
+}
+
+// Utility functions
+function showLoading(show) {
+    loadingDiv.classList.toggle('hidden', !show);
+}
+
+function showError(message) {
+    errorDiv.textContent = message;
+    errorDiv.classList.remove('hidden');
+
+    // Auto-hide error after 5 seconds
+    setTimeout(hideError, 5000);
+}
+
+function hideError() {
+    errorDiv.classList.add('hidden');
+}
@@ -0,0 +1,1123 @@
+import atexit
+import bisect
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from functools import partial
+from heapq import merge
+from itertools import compress
+
+import codec
+import snapshot as binary_snapshot
+from models import Todo, format_timestamp
+from search import SearchIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(Exception):
+    """A batch operation names a todo that does not exist"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+class PreconditionFailed(Exception):
+    """A todo no longer matches the version the client based a change on"""
+
+
+def todo_etag(todo):
+    """Strong entity tag for one todo, derived from its contents"""
+    body = codec.dumps(todo, sort_keys=True)
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+def load_todos(path, lazy=False):
+    """Load todos and the next free id from a JSON or binary snapshot file.
+
+    Older JSON files hold a bare list of todos; their next id is derived
+    from the largest id in the list. With ``lazy`` a binary snapshot is
+    memory-mapped and comes back as a LazyTodos mapping instead of a list.
+    """
+    if binary_snapshot.is_snapshot(path):
+        if lazy:
+            view = binary_snapshot.SnapshotView(path)
+            return LazyTodos(view), view.next_id
+        return binary_snapshot.load(path)
+    data = []
+    try:
+        with open(path, 'rb') as f:
+            data = codec.loads(f.read())
+    except FileNotFoundError:
+        pass
+    if isinstance(data, list):
+        data = {'todos': data}
+    todos = [Todo.from_dict(t) for t in data['todos']]
+    next_id = max(data.get('next_id', 1), max((t.id for t in todos), default=0) + 1)
+    return todos, next_id
+
+
+class LazyTodos(MutableMapping):
+    """id -> todo mapping over a SnapshotView, with changes kept aside.
+
+    Todos written since the snapshot live in an ordinary dict; everything
+    else is decoded from the mapped file when it is looked up. Iteration
+    is not in id order.
+    """
+
+    # Swaps the 0/1 bytes of a completed column
+    _INVERT = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+    def __init__(self, view):
+        self.view = view
+        self._changed = {}
+        # Snapshot ids that were deleted or are overridden by _changed
+        self._shadowed = set()
+
+    def __getitem__(self, todo_id):
+        if todo_id in self._changed:
+            return self._changed[todo_id]
+        if todo_id in self._shadowed:
+            raise KeyError(todo_id)
+        return self.view[todo_id]
+
+    def __setitem__(self, todo_id, todo):
+        self._changed[todo_id] = todo
+        if todo_id in self.view:
+            self._shadowed.add(todo_id)
+
+    def __delitem__(self, todo_id):
+        if todo_id in self._changed:
+            del self._changed[todo_id]
+        elif todo_id in self._shadowed or todo_id not in self.view:
+            raise KeyError(todo_id)
+        if todo_id in self.view:
+            self._shadowed.add(todo_id)
+
+    def __contains__(self, todo_id):
+        return todo_id in self._changed or (todo_id not in self._shadowed and todo_id in self.view)
+
+    def __iter__(self):
+        for todo_id in self.view.ids:
+            if todo_id not in self._shadowed:
+                yield todo_id
+        yield from self._changed
+
+    def __len__(self):
+        return len(self.view) - len(self._shadowed) + len(self._changed)
+
+    def indexes(self):
+        """Sorted arrays of all, active and completed ids.
+
+        Built from the ``ids`` and ``completed`` columns without decoding
+        any todo that has not changed since the snapshot.
+        """
+        ids = array('q')
+        ids.frombytes(self.view.ids.cast('B'))
+        completed = bytes(self.view.completed)
+        if self._shadowed:
+            keep = [todo_id not in self._shadowed for todo_id in ids]
+            ids = array('q', compress(ids, keep))
+            completed = bytes(compress(completed, keep))
+        by_status = {
+            False: array('q', compress(ids, completed.translate(self._INVERT))),
+            True: array('q', compress(ids, completed)),
+        }
+        if self._changed:
+            changed = sorted(self._changed)
+            ids = array('q', merge(ids, changed))
+            for done in (False, True):
+                extra = [i for i in changed if self._changed[i].completed == done]
+                by_status[done] = array('q', merge(by_status[done], extra))
+        return ids, by_status
+
+
+def save_todos(todos, next_id, path, pretty=False, binary=False):
+    """Save todos and the next free id to JSON file.
+
+    With ``binary`` the file is a snapshot.py snapshot instead; JSON is
+    compact unless ``pretty`` asks for it to be indented. The data goes
+    to a temporary file that is fsynced and then renamed over ``path``,
+    so readers see either the old or the new file, never a half-written
+    one.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            if binary:
+                binary_snapshot.dump(todos, next_id, f)
+            else:
+                f.write(codec.dumps({'next_id': next_id, 'todos': todos}, pretty=pretty))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_stamp(path):
+    """Identify the current contents of ``path`` without reading it"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on ``path`` across processes"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def truncate_torn_record(path, block_size=65536):
+    """Cut a half-written last line, left by a crash mid-append, off ``path``
+
+    Only call this while nothing else can be appending to the file.
+    """
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        end = size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # Walk back to the newline ending the last complete record
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end == size:
+            return
+        logger.warning('Truncating torn record at end of %s', path)
+        f.truncate(end)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class RevisionCounter:
+    """A collection version shared by processes, kept in a small file.
+
+    The file holds an epoch (random, picked when the file is created) and
+    a revision. Read and write it only while holding the backend's lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        """Return ``(epoch, revision)``, starting a new epoch if there is none"""
+        try:
+            with open(self.path) as f:
+                epoch, revision = f.read().split()
+            return epoch, int(revision)
+        except (FileNotFoundError, ValueError):
+            # A new epoch can never be mistaken for versions handed out before
+            return self.write(os.urandom(4).hex(), 0)
+
+    def write(self, epoch, revision):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(f'{epoch} {revision}\n')
+        os.replace(tmp_path, self.path)
+        return epoch, revision
+
+
+class JSONFileBackend:
+    """Rewrites the whole JSON (or ``binary`` snapshot) file on every flush"""
+
+    def __init__(self, path, pretty=False, binary=False, lazy=False):
+        self.path = path
+        self.pretty = pretty
+        self.binary = binary
+        self.lazy = lazy
+
+    def load(self):
+        return load_todos(self.path, lazy=self.lazy)
+
+    def locked(self):
+        return file_lock(self.path + '.lock')
+
+    def version(self):
+        return file_stamp(self.path)
+
+    def wants_snapshot(self):
+        return True
+
+    def commit(self, records, snapshot):
+        save_todos(*snapshot, self.path, pretty=self.pretty, binary=self.binary)
+
+    def after_fork(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WriteAheadLogBackend:
+    """Appends one JSON line per mutation to ``<path>.log``.
+
+    On startup the snapshot at ``path`` is loaded and the log is
+    replayed on top of it. Once the log grows past ``compact_bytes`` it is
+    rotated to ``<path>.log.1`` and a background thread folds it into a
+    fresh snapshot. Records carry whole todos (or explicit ids for
+    deletes), so replaying a rotated log over a snapshot that already
+    contains it is harmless if we crash mid-compaction.
+    """
+
+    def __init__(self, path, compact_bytes=4 * 1024 * 1024, shared=False, pretty=False,
+                 binary=False, lazy=False):
+        self.path = path
+        # Apply to the snapshot only; log records are always one JSON line
+        self.pretty = pretty
+        self.binary = binary
+        self.lazy = lazy
+        self.log_path = path + '.log'
+        self.rotated_path = self.log_path + '.1'
+        self.compact_bytes = compact_bytes
+        # Processes sharing the log compact inline, under locked()
+        self.shared = shared
+        self._log = None
+        self._compactor = None
+
+    def load(self):
+        todos, next_id = load_todos(self.path, lazy=self.lazy)
+        if not isinstance(todos, LazyTodos):
+            todos = {t.id: t for t in todos}
+        for log_path in (self.rotated_path, self.log_path):
+            next_id = self._replay(log_path, todos, next_id)
+            if not self.shared:
+                # Nobody else appends, so once is enough
+                truncate_torn_record(log_path)
+        # Another process may have rotated the log since we opened it
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, 'ab')
+        return todos if isinstance(todos, LazyTodos) else list(todos.values()), next_id
+
+    def locked(self):
+        return file_lock(self.path + '.lock')
+
+    def version(self):
+        return file_stamp(self.path), file_stamp(self.log_path)
+
+    def wants_snapshot(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        return os.fstat(self._log.fileno()).st_size >= self.compact_bytes
+
+    def commit(self, records, snapshot):
+        if self.shared:
+            # A crashed writer may have left a torn record that the next
+            # one must not be appended onto; nobody else appends while we
+            # commit
+            truncate_torn_record(self.log_path)
+            truncate_torn_record(self.rotated_path)
+        self._log.write(b''.join(codec.dumps(r) + b'\n' for r in records))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        if snapshot is not None:
+            self._log.close()
+            if os.path.exists(self.rotated_path):
+                # Left behind by a compaction that never finished; its
+                # records are not in the snapshot yet, so keep them
+                with open(self.log_path, 'rb') as src, open(self.rotated_path, 'ab') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.log_path)
+            else:
+                os.replace(self.log_path, self.rotated_path)
+            self._log = open(self.log_path, 'ab')
+            if self.shared:
+                self._compact(snapshot)
+            else:
+                self._compactor = threading.Thread(target=self._compact, args=(snapshot,),
+                                                   name='todo-compactor')
+                self._compactor.start()
+
+    def after_fork(self):
+        # The parent's compactor thread did not come along
+        self._compactor = None
+        if self._log is not None:
+            self._log = open(self.log_path, 'ab')
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        if self._log is not None:
+            self._log.close()
+
+    def _compact(self, snapshot):
+        try:
+            save_todos(*snapshot, self.path, pretty=self.pretty, binary=self.binary)
+            os.remove(self.rotated_path)
+        except Exception:
+            logger.exception('Failed to compact %s', self.log_path)
+
+    def _replay(self, log_path, todos, next_id):
+        if not os.path.exists(log_path):
+            return next_id
+        with open(log_path, 'rb') as f:
+            lines = f.readlines()
+        for lineno, line in enumerate(lines, 1):
+            try:
+                record = codec.loads(line)
+            except codec.DecodeError:
+                # A torn final line is what a crash mid-append leaves behind
+                if lineno == len(lines):
+                    logger.warning('Ignoring truncated record at end of %s', log_path)
+                    break
+                raise
+            if 'todo' in record:
+                record['todo'] = Todo.from_dict(record['todo'])
+            apply_record(todos, record)
+            if record['op'] == 'create':
+                next_id = max(next_id, record['todo'].id + 1)
+        return next_id
+
+
+class SQLiteBackend:
+    """Keeps todos in a SQLite database, one row per todo.
+
+    The database runs in WAL mode with an index on ``completed``; every
+    record becomes a point INSERT/UPDATE/DELETE on the ``id`` primary key,
+    and all records of one flush share a transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connect()
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS todos ('
+                'id INTEGER PRIMARY KEY, '
+                'text TEXT NOT NULL, '
+                'completed INTEGER NOT NULL DEFAULT 0, '
+                'created_at TEXT NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS todos_completed ON todos (completed)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def load(self):
+        rows = self._db.execute('SELECT id, text, completed, created_at FROM todos ORDER BY id')
+        todos = [Todo.from_dict({'id': todo_id, 'text': text, 'completed': completed, 'created_at': created_at})
+                 for todo_id, text, completed, created_at in rows]
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        next_id = max(row[0] if row else 1, todos[-1].id + 1 if todos else 1)
+        return todos, next_id
+
+    def locked(self):
+        return file_lock(self.path + '.lock')
+
+    def version(self):
+        # Bumped whenever another connection commits
+        return self._db.execute('PRAGMA data_version').fetchone()[0]
+
+    def wants_snapshot(self):
+        return False
+
+    def commit(self, records, snapshot):
+        with self._db:
+            for record in records:
+                op = record['op']
+                if op == 'create':
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO todos (id, text, completed, created_at) VALUES (?, ?, ?, ?)',
+                        self._row(record['todo'])
+                    )
+                    self._bump_next_id(record['todo'].id + 1)
+                elif op == 'update':
+                    todo = record['todo']
+                    self._db.execute(
+                        'UPDATE todos SET text = ?, completed = ? WHERE id = ?',
+                        (todo.text, todo.completed, todo.id)
+                    )
+                elif op == 'delete':
+                    self._db.execute('DELETE FROM todos WHERE id = ?', (record['id'],))
+                elif op == 'clear_completed':
+                    self._db.executemany('DELETE FROM todos WHERE id = ?',
+                                         [(todo_id,) for todo_id in record['ids']])
+                else:
+                    raise ValueError('Unknown log record: %r' % (op,))
+
+    def import_todos(self, todos):
+        """Insert (or overwrite) ``todos`` in a single transaction"""
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO todos (id, text, completed, created_at) VALUES (?, ?, ?, ?)',
+                [self._row(todo) for todo in todos]
+            )
+            self._bump_next_id(max((t.id for t in todos), default=0) + 1)
+
+    def after_fork(self):
+        # SQLite connections must not cross a fork. Keep the parent's
+        # referenced so it is never closed (or collected) here, which
+        # would touch state it shares with the parent
+        self._inherited = self._db
+        self._connect()
+
+    def close(self):
+        self._db.close()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+
+    def _bump_next_id(self, next_id):
+        self._db.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)",
+            (next_id,)
+        )
+
+    @staticmethod
+    def _row(todo):
+        return todo.id, todo.text, todo.completed, format_timestamp(todo.created_at)
+
+
+def apply_record(todos, record):
+    """Replay one log record onto an id -> Todo dict"""
+    op = record['op']
+    if op in ('create', 'update'):
+        todos[record['todo'].id] = record['todo']
+    elif op == 'delete':
+        todos.pop(record['id'], None)
+    elif op == 'clear_completed':
+        for todo_id in record['ids']:
+            todos.pop(todo_id, None)
+    else:
+        raise ValueError('Unknown log record: %r' % (op,))
+
+
+class TodoStore:
+    """Process-resident todo list, loaded once and written behind.
+
+    Reads are answered from memory. Each mutation queues a log record;
+    a background thread hands the queued records to the backend every
+    ``flush_interval`` seconds, or sooner once ``flush_threshold`` of
+    them are pending. ``close()`` (registered with atexit) writes
+    whatever is still pending on shutdown.
+
+    With ``shared=True`` several processes (e.g. gunicorn workers) can use
+    the same backend. Every read first compares ``backend.version()`` with
+    the version last seen and reloads, under the backend's cross-process
+    lock, if another process has written since. Every mutation runs under
+    that lock too and is committed before the lock is released, so there
+    is no write-behind in this mode. The collection version comes from a
+    RevisionCounter next to the backend's file, bumped with every commit,
+    so all processes tag the same todos alike; a reload journals what
+    changed by comparing the old todos with the new ones.
+
+    Todos are indexed by id, so lookups, updates and deletes are O(1), and
+    a sorted id array lets ``page()`` seek to a cursor in O(log N). Active
+    and completed ids are kept in two more sorted arrays, so filtered pages
+    and ``stats()`` never scan the whole collection. When the backend
+    hands over a LazyTodos mapping, the id index is that mapping and the
+    arrays are built straight from the snapshot's columns, so todos that
+    are never looked up are never decoded.
+    Ids come from a counter that the backend persists and are never
+    reused, even after the newest todo is deleted. ``version`` changes
+    with every mutation (and every reload), which makes it usable as an
+    entity tag for the whole collection. The last ``journal_size``
+    changes are kept in a journal so ``changes_since()`` can tell a client
+    what happened after the version it last saw (with ``journal_size=0``
+    it always gets a snapshot), and callbacks registered with
+    ``subscribe()`` are poked after every change so push streams know when
+    to ask. ``search()`` uses an inverted index over the text, and
+    ``created_page()`` sorted (created_at, id) indexes, one for all todos
+    and one per status; each is built on first use and kept current by
+    every mutation after that. Stored Todo records are never mutated in
+    place, so the lists handed out by ``all()`` stay consistent while
+    other requests write.
+    """
+
+    # Attempts at a consistent reload before giving up
+    RELOAD_RETRIES = 5
+
+    def __init__(self, backend, flush_interval=1.0, flush_threshold=100, shared=False,
+                 journal_size=10000):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._writers = 0
+        # Versions from different processes or runs must never collide;
+        # shared stores take theirs from the counter instead
+        self._epoch = os.urandom(4).hex()
+        self._revision = 0
+        self._counter = RevisionCounter(backend.path + '.version') if shared else None
+        self._todos = None
+        # (revision, change, id) for recent mutations; complete for every
+        # revision from _journal_start on
+        self._journal = deque(maxlen=journal_size)
+        self._journal_start = 0
+        self._subscribers = []
+        self._search = None
+        self._by_created = None
+        self._reload()
+        self._pending = []
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._flusher = None
+        if not shared:
+            self._flusher = threading.Thread(target=self._run, name='todo-flusher', daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    @property
+    def version(self):
+        return f'{self._epoch}.{self._revision}'
+
+    def current_version(self):
+        """``version`` after picking up writes from other processes"""
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return [self._todos[i] for i in self._ids]
+
+    def page(self, after=None, limit=None, completed=None):
+        """Return up to ``limit`` todos with ids above ``after``.
+
+        ``completed`` restricts the page to completed (True) or active
+        (False) todos. The second item is the cursor for the following
+        page, or None when nothing is left.
+        """
+        with self._lock:
+            self._refresh()
+            all_ids = self._ids if completed is None else self._by_status[completed]
+            start = bisect.bisect_right(all_ids, after) if after is not None else 0
+            ids = all_ids[start:start + limit] if limit is not None else all_ids[start:]
+            more = start + len(ids) < len(all_ids)
+            return [self._todos[i] for i in ids], (ids[-1] if ids and more else None)
+
+    def created_page(self, after=None, limit=None, completed=None, since=None, until=None,
+                     newest=False):
+        """Return up to ``limit`` todos in order of creation.
+
+        ``since`` and ``until`` bound created_at (in microseconds, both
+        exclusive) and ``newest`` reverses the order. ``after`` is the
+        ``(created_at, id)`` key of the last todo of the previous page, and
+        the second item returned is the key for the next page, or None.
+        ``completed`` filters as in ``page()``, with an index of its own, so
+        a page costs O(log N + limit) whatever the filter.
+        """
+        with self._lock:
+            self._refresh()
+            stamps, ids = self._created_index(completed)
+            start = 0 if since is None else bisect.bisect_right(stamps, since)
+            end = len(stamps) if until is None else bisect.bisect_left(stamps, until)
+            if newest:
+                if after is not None:
+                    end = min(end, _key_position(stamps, ids, after))
+                positions = range(end - 1, start - 1, -1)
+            else:
+                if after is not None:
+                    start = max(start, _key_position(stamps, ids, after, right=True))
+                positions = range(start, end)
+
+            more = limit is not None and len(positions) > limit
+            todos = [self._todos[ids[i]] for i in positions[:limit]]
+            last = todos[-1] if more else None
+            return todos, (last.created_at, last.id) if last else None
+
+    def chunks(self, completed=None, size=500, **created):
+        """Yield every todo in id order as lists of up to ``size``.
+
+        With keyword arguments for ``created_page()`` (``since``, ``until``,
+        ``newest``) the todos come in creation order instead. The lock is
+        held for one chunk at a time, so writers are not held up by a long
+        listing; a chunk reflects the store as it was when that chunk was
+        taken.
+        """
+        page = partial(self.created_page, **created) if created else self.page
+        after = None
+        while True:
+            todos, after = page(after=after, limit=size, completed=completed)
+            yield todos
+            if after is None:
+                return
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            active = len(self._by_status[False])
+            completed = len(self._by_status[True])
+        return {'total': active + completed, 'active': active, 'completed': completed}
+
+    def changes_since(self, version, todos=True):
+        """Describe what changed after ``version``.
+
+        Returns ``{'version', 'created', 'updated', 'deleted'}`` with the
+        affected todos (ids only for deleted ones), or
+        ``{'version', 'snapshot': True, 'todos'}`` with everything when the
+        journal no longer reaches back to ``version``. Callers that only
+        need to know about the reset pass ``todos=False`` to skip building
+        that list.
+        """
+        with self._lock:
+            self._refresh()
+            epoch, _, revision = (version or '').partition('.')
+            if epoch != self._epoch or not revision.isdigit() or int(revision) < self._journal_start:
+                changes = {'version': self.version, 'snapshot': True}
+                if todos:
+                    changes['todos'] = [self._todos[i] for i in self._ids]
+                return changes
+
+            since = int(revision)
+            created = set()
+            touched = {}
+            for rev, change, todo_id in reversed(self._journal):
+                if rev <= since:
+                    break
+                touched.setdefault(todo_id, change)
+                if change == 'created':
+                    created.add(todo_id)
+
+            changes = {'version': self.version, 'created': [], 'updated': [], 'deleted': []}
+            for todo_id, last_change in touched.items():
+                if last_change == 'deleted':
+                    # Clients never saw todos that came and went since
+                    if todo_id not in created:
+                        changes['deleted'].append(todo_id)
+                elif todo_id in created:
+                    changes['created'].append(self._todos[todo_id])
+                else:
+                    changes['updated'].append(self._todos[todo_id])
+            return changes
+
+    def subscribe(self, callback):
+        """Call ``callback()`` after every change.
+
+        Callbacks run with the store lock held, so they should only signal
+        someone else (set an event, schedule a task) and return.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def search(self, query, limit=20, completed=None):
+        """Return up to ``limit`` todos matching every word of ``query``.
+
+        Words match whole words or their prefixes, case-insensitively, and
+        results come best match first; ``completed`` filters as in
+        ``page()``.
+        """
+        with self._lock:
+            self._refresh()
+            if self._search is None:
+                self._search = SearchIndex(self._todos[i] for i in self._ids)
+            accept = None
+            if completed is not None:
+                status_ids = self._by_status[completed]
+                accept = lambda todo_id: _contains_sorted(status_ids, todo_id)
+            return [self._todos[i] for i in self._search.search(query, limit, accept)]
+
+    def get(self, todo_id):
+        with self._lock:
+            self._refresh()
+            return self._todos.get(todo_id)
+
+    def add(self, text):
+        with self._writing():
+            todo = Todo.new(self._next_id, text)
+            self._next_id += 1
+            self._todos[todo.id] = todo
+            self._ids.append(todo.id)
+            self._by_status[False].append(todo.id)
+            if self._by_created is not None:
+                for key in (None, False):
+                    _insert_key(*self._by_created[key], todo.created_at, todo.id)
+            self._reindex(None, todo)
+            self._log({'op': 'create', 'todo': todo})
+            return todo
+
+    def update(self, todo_id, changes, precondition=None):
+        """Apply ``changes`` to a todo; returns the new record or None.
+
+        If given, ``precondition`` is called with the current record and
+        PreconditionFailed is raised unless it returns true.
+        """
+        with self._writing():
+            todo = self._todos.get(todo_id)
+            if todo is None:
+                return None
+            if precondition is not None and not precondition(todo):
+                raise PreconditionFailed(todo_id)
+            was_completed = todo.completed
+            old, todo = todo, todo.replace(**changes)
+            self._todos[todo_id] = todo
+            if todo.text != old.text:
+                self._reindex(old, todo)
+            if todo.completed != was_completed:
+                _remove_sorted(self._by_status[was_completed], todo_id)
+                bisect.insort(self._by_status[not was_completed], todo_id)
+                if self._by_created is not None:
+                    _remove_key(*self._by_created[was_completed], todo.created_at, todo_id)
+                    _insert_key(*self._by_created[not was_completed], todo.created_at, todo_id)
+            self._log({'op': 'update', 'todo': todo})
+            return todo
+
+    def delete(self, todo_id, precondition=None):
+        """Delete a todo; returns False if it does not exist.
+
+        ``precondition`` works as for ``update()``.
+        """
+        with self._writing():
+            todo = self._todos.get(todo_id)
+            if todo is None:
+                return False
+            if precondition is not None and not precondition(todo):
+                raise PreconditionFailed(todo_id)
+            del self._todos[todo_id]
+            if self._by_created is not None:
+                for key in (None, todo.completed):
+                    _remove_key(*self._by_created[key], todo.created_at, todo_id)
+            self._reindex(todo, None)
+            _remove_sorted(self._ids, todo_id)
+            _remove_sorted(self._by_status[todo.completed], todo_id)
+            self._log({'op': 'delete', 'id': todo_id})
+            return True
+
+    def clear_completed(self):
+        with self._writing():
+            ids = self._by_status[True].tolist()
+            for todo_id in ids:
+                if self._search is not None:
+                    self._reindex(self._todos[todo_id], None)
+                del self._todos[todo_id]
+            if ids:
+                self._by_status[True] = array('q')
+                self._ids = array('q', self._by_status[False])
+                if self._by_created is not None:
+                    # The active todos are what is left of the whole index
+                    self._by_created[None] = tuple(array('q', a) for a in self._by_created[False])
+                    self._by_created[True] = array('q'), array('q')
+                self._log({'op': 'clear_completed', 'ids': ids})
+            return len(ids)
+
+    def batch(self, operations):
+        """Apply ``operations`` all-or-nothing and write them out at once.
+
+        Each operation is ``('create', text)``, ``('update', id, changes)``
+        or ``('delete', id)``. Returns one todo per operation (None for
+        deletes). Raises BatchError, having applied nothing, if an update or
+        delete names a todo that does not exist.
+        """
+        with self._writing():
+            deleted = set()
+            for index, (op, *args) in enumerate(operations):
+                if op == 'create':
+                    continue
+                if args[0] not in self._todos or args[0] in deleted:
+                    raise BatchError(index, f'Todo {args[0]} not found')
+                if op == 'delete':
+                    deleted.add(args[0])
+
+            results = []
+            for op, *args in operations:
+                if op == 'create':
+                    results.append(self.add(*args))
+                elif op == 'update':
+                    results.append(self.update(*args))
+                else:
+                    self.delete(*args)
+                    results.append(None)
+        self.flush()
+        return results
+
+    def flush(self):
+        """Write pending mutations to disk now"""
+        with self._flush_lock:
+            with self._lock:
+                records = self._pending
+                if not records:
+                    return
+                snapshot = None
+                if self.backend.wants_snapshot():
+                    snapshot = [self._todos[i] for i in self._ids], self._next_id
+                self._pending = []
+            try:
+                self.backend.commit(records, snapshot)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = records
+                raise
+
+    def after_fork(self, reload=False):
+        """Make an inherited store usable in a freshly forked child.
+
+        Only the forking thread survives a fork, so locks it did not hold
+        are recreated and the flusher restarted. Unless versions come from
+        the shared counter, the child gets its own epoch so its versions
+        cannot be mistaken for a sibling's. With
+        ``reload`` the todos are read from the backend again instead of
+        reusing the parent's copy.
+        """
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._subscribers = []
+        if not self.shared:
+            self._epoch = os.urandom(4).hex()
+        self._journal.clear()
+        self._journal_start = self._revision
+        self.backend.after_fork()
+        if reload:
+            self._reload()
+        if self._flusher is not None:
+            self._flusher = threading.Thread(target=self._run, name='todo-flusher', daemon=True)
+            self._flusher.start()
+
+    def close(self):
+        """Stop the background flusher and write anything still pending"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.backend.close()
+
+    def _reload(self, locked=False):
+        """Rebuild the in-memory indexes from the backend.
+
+        Shared stores reload under the backend's lock (``locked`` says it
+        is held already), so the todos and the counter agree.
+        """
+        if self.shared and not locked:
+            with self.backend.locked():
+                return self._reload(locked=True)
+        for attempt in range(self.RELOAD_RETRIES):
+            version = self.backend.version()
+            try:
+                todos, next_id = self.backend.load()
+            except ValueError:
+                # Caught a file mid-rewrite by a process that does not
+                # write atomically; it will be whole again shortly
+                if attempt == self.RELOAD_RETRIES - 1:
+                    raise
+            else:
+                if not self.shared or self.backend.version() == version:
+                    break
+            time.sleep(0.01 * (attempt + 1))
+        else:
+            # Writers kept racing us; what we read is still a committed state
+            logger.warning('Reloaded todos while they were being written')
+        self._next_id = next_id
+        old = self._todos
+        if isinstance(todos, LazyTodos):
+            self._todos = todos
+            self._ids, self._by_status = todos.indexes()
+        else:
+            self._todos = {t.id: t for t in sorted(todos, key=lambda t: t.id)}
+            self._ids = array('q', self._todos)
+            self._by_status = {False: array('q'), True: array('q')}
+            for todo in self._todos.values():
+                self._by_status[todo.completed].append(todo.id)
+        # Rebuilt on next use rather than now
+        self._search = None
+        self._by_created = None
+        self._backend_version = version
+        if not self.shared:
+            self._revision += 1
+            self._journal.clear()
+            self._journal_start = self._revision
+        else:
+            epoch, revision = self._counter.read()
+            if epoch == self._epoch and revision <= self._revision:
+                # Changed without the counter moving on; make sure clients
+                # holding our version do not take it for this data
+                revision = self._counter.write(epoch, self._revision + 1)[1]
+            same_epoch = epoch == self._epoch
+            self._epoch, self._revision = epoch, revision
+            if old is None or not same_epoch or isinstance(old, LazyTodos) or isinstance(todos, LazyTodos):
+                # Comparing would decode every todo, or there is nothing to compare
+                self._journal.clear()
+                self._journal_start = self._revision
+            else:
+                self._journal_diff(old, self._todos)
+        self._notify()
+
+    def _journal_diff(self, old, new):
+        """Journal the changes between two id -> Todo dicts at the current revision"""
+        for todo_id, todo in new.items():
+            previous = old.get(todo_id)
+            if previous is None:
+                self._journal_change('created', todo_id)
+            elif previous != todo:
+                self._journal_change('updated', todo_id)
+        for todo_id in old.keys() - new.keys():
+            self._journal_change('deleted', todo_id)
+
+    def _refresh(self, locked=False):
+        if self.shared and self.backend.version() != self._backend_version:
+            self._reload(locked)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the locks a mutation needs; in shared mode, commit it too"""
+        with self._lock:
+            if not self.shared or self._writers:
+                self._writers += 1
+                try:
+                    yield
+                finally:
+                    self._writers -= 1
+                return
+            with self.backend.locked():
+                self._refresh(locked=True)
+                self._writers += 1
+                try:
+                    yield
+                finally:
+                    self._writers -= 1
+                records, self._pending = self._pending, []
+                if records:
+                    snapshot = None
+                    if self.backend.wants_snapshot():
+                        snapshot = [self._todos[i] for i in self._ids], self._next_id
+                    # Bumped first: should the commit fail, the version of
+                    # what is on disk runs ahead, which only costs a refetch
+                    self._counter.write(self._epoch, self._revision)
+                    try:
+                        self.backend.commit(records, snapshot)
+                    except Exception:
+                        # Memory is ahead of disk now; start over from disk
+                        self._backend_version = None
+                        raise
+                    self._backend_version = self.backend.version()
+
+    def _log(self, record):
+        self._revision += 1
+        op = record['op']
+        if op == 'clear_completed':
+            for todo_id in record['ids']:
+                self._journal_change('deleted', todo_id)
+        else:
+            todo_id = record['id'] if op == 'delete' else record['todo'].id
+            self._journal_change({'create': 'created', 'update': 'updated', 'delete': 'deleted'}[op], todo_id)
+        self._pending.append(record)
+        self._notify()
+        if len(self._pending) >= self.flush_threshold:
+            self._wakeup.set()
+
+    def _created_index(self, completed=None):
+        """Parallel arrays of created_at and id, sorted by (created_at, id).
+
+        There is one pair for all todos (``completed`` None) and one for
+        each status.
+        """
+        if self._by_created is None:
+            keys = sorted((self._todos[i].created_at, i) for i in self._ids)
+            done = [self._todos[i].completed for _, i in keys]
+            self._by_created = {None: (array('q', [k[0] for k in keys]), array('q', [k[1] for k in keys]))}
+            for status in (False, True):
+                keep = [d == status for d in done]
+                self._by_created[status] = (array('q', compress(self._by_created[None][0], keep)),
+                                            array('q', compress(self._by_created[None][1], keep)))
+        return self._by_created[completed]
+
+    def _reindex(self, old, new):
+        """Swap ``old`` for ``new`` (either may be None) in the search index"""
+        if self._search is None:
+            return
+        if old is not None:
+            self._search.remove(old)
+        if new is not None:
+            self._search.add(new)
+
+    def _notify(self):
+        for callback in self._subscribers:
+            callback()
+
+    def _journal_change(self, change, todo_id):
+        if not self._journal.maxlen:
+            # Nothing is kept; only the current version is up to date
+            self._journal_start = self._revision
+        elif len(self._journal) == self._journal.maxlen:
+            # The oldest entry drops out; its revision is only partly covered now
+            self._journal_start = self._journal[0][0]
+        self._journal.append((self._revision, change, todo_id))
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush todos')
+
+
+def _remove_sorted(ids, todo_id):
+    del ids[bisect.bisect_left(ids, todo_id)]
+
+
+def _key_position(stamps, ids, key, right=False):
+    """Where ``(created_at, id)`` is, or would go, in the created index"""
+    created_at, todo_id = key
+    lo = bisect.bisect_left(stamps, created_at)
+    hi = bisect.bisect_right(stamps, created_at, lo)
+    if right:
+        return bisect.bisect_right(ids, todo_id, lo, hi)
+    return bisect.bisect_left(ids, todo_id, lo, hi)
+
+
+def _insert_key(stamps, ids, created_at, todo_id):
+    i = _key_position(stamps, ids, (created_at, todo_id))
+    stamps.insert(i, created_at)
+    ids.insert(i, todo_id)
+
+
+def _remove_key(stamps, ids, created_at, todo_id):
+    i = _key_position(stamps, ids, (created_at, todo_id))
+    del stamps[i], ids[i]
+
+
+def _contains_sorted(ids, todo_id):
+    i = bisect.bisect_left(ids, todo_id)
+    return i < len(ids) and ids[i] == todo_id
@@ -0,0 +1,108 @@
+import codec
+from models import Todo
+from storage import (LazyTodos, TodoStore, WriteAheadLogBackend, load_todos,
+                     save_todos)
+
+
+def make_todos(count):
+    return [Todo(i, f'todo {i}', i % 3 == 0, 1700000000000000 + i) for i in range(1, count + 1)]
+
+
+def record(op, todo):
+    return codec.dumps({'op': op, 'todo': todo}) + b'\n'
+
+
+def test_wal_replay_ignores_torn_tail(tmp_path):
+    path = str(tmp_path / 'todos.json')
+    store = TodoStore(WriteAheadLogBackend(path))
+    store.add('first')
+    store.add('second')
+    store.close()
+    with open(path + '.log', 'ab') as f:
+        f.write(record('create', Todo(3, 'torn', False, 0))[:20])
+
+    store = TodoStore(WriteAheadLogBackend(path))
+    assert [t.text for t in store.all()] == ['first', 'second']
+    # The torn record is cut off, so the next one starts on a line of its own
+    store.add('third')
+    store.close()
+
+    store = TodoStore(WriteAheadLogBackend(path))
+    assert [t.text for t in store.all()] == ['first', 'second', 'third']
+    store.close()
+
+
+def test_wal_recovers_crash_between_rotation_and_compaction(tmp_path):
+    path = str(tmp_path / 'todos.json')
+    todos = make_todos(3)
+    save_todos(todos[:1], 2, path)
+    # Rotated but never folded into the snapshot, with newer records after it
+    with open(path + '.log.1', 'wb') as f:
+        f.write(record('create', todos[1]))
+        f.write(record('update', todos[0].replace(completed=True)))
+    with open(path + '.log', 'wb') as f:
+        f.write(record('create', todos[2]))
+        f.write(codec.dumps({'op': 'delete', 'id': 2}) + b'\n')
+
+    store = TodoStore(WriteAheadLogBackend(path, compact_bytes=1))
+    assert store.all() == [todos[0].replace(completed=True), todos[2]]
+    # The next snapshot keeps the rotated records instead of dropping them
+    store.add('after')
+    store.close()
+
+    store = TodoStore(WriteAheadLogBackend(path))
+    assert [t.text for t in store.all()] == ['todo 1', 'todo 3', 'after']
+    assert store.all()[0].completed
+    store.close()
+
+
+def test_binary_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'todos.bin')
+    todos = make_todos(50) + [Todo(60, 'ünïcødé ✓', True, 0)]
+    save_todos(todos, 61, path, binary=True)
+
+    assert load_todos(path) == (todos, 61)
+    lazy, next_id = load_todos(path, lazy=True)
+    assert isinstance(lazy, LazyTodos)
+    assert next_id == 61
+    assert sorted(lazy) == [t.id for t in todos]
+    assert all(lazy[t.id] == t for t in todos)
+
+
+def test_changes_since_folds_changes(tmp_path):
+    store = TodoStore(WriteAheadLogBackend(str(tmp_path / 'todos.json')))
+    kept = store.add('kept')
+    gone = store.add('gone')
+    version = store.version
+
+    fresh = store.add('fresh')
+    store.update(fresh.id, {'text': 'fresh, edited'})
+    store.update(kept.id, {'completed': True})
+    store.update(kept.id, {'text': 'kept, edited'})
+    store.update(gone.id, {'completed': True})
+    store.delete(gone.id)
+    brief = store.add('brief')
+    store.delete(brief.id)
+
+    changes = store.changes_since(version)
+    assert changes['version'] == store.version
+    assert [t.text for t in changes['created']] == ['fresh, edited']
+    assert [(t.text, t.completed) for t in changes['updated']] == [('kept, edited', True)]
+    assert changes['deleted'] == [gone.id]
+    assert store.changes_since(store.version) == {
+        'version': store.version, 'created': [], 'updated': [], 'deleted': []}
+    store.close()
+
+
+def test_changes_since_snapshots_unknown_versions(tmp_path):
+    store = TodoStore(WriteAheadLogBackend(str(tmp_path / 'todos.json')), journal_size=2)
+    version = store.version
+    for text in ('a', 'b', 'c'):
+        store.add(text)
+
+    changes = store.changes_since(version)
+    assert changes['snapshot']
+    assert [t.text for t in changes['todos']] == ['a', 'b', 'c']
+    assert store.changes_since('elsewhere.1', todos=False) == {
+        'version': store.version, 'snapshot': True}
+    store.close()